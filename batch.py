@@ -0,0 +1,106 @@
+import numpy as np
+
+# Texture coordinates of the (start, mid, end) corners of a segment for the shader fill: the curve is
+# where u^2 - v = 0, see render.BezierShader
+curve_uv = np.array([(0, 0), (0.5, 0), (1, 1)], np.float32)
+
+def fan_triangles(tess, inout):
+    ''' (n, 3) vertex indices into tess.verts of the triangles of all fans. Only the forward fan of each
+    segment, the triangles get drawn regardless of their winding. '''
+    ntri = tess.nums - 1 if inout == 0 else tess.nums - 2
+    seg = np.repeat(np.arange(len(ntri)), ntri)
+    j = np.arange(len(seg)) - np.repeat(np.cumsum(ntri) - ntri, ntri)
+    centre = tess.offsets[seg] + (inout != 0)
+    return np.stack((centre, centre + 1 + j, centre + 2 + j), axis=1), seg
+
+
+def polyline_pairs(tess):
+    ''' (n, 2) vertex indices into tess.verts of the consecutive samples of all segments '''
+    nlines = tess.nums - 1
+    seg = np.repeat(np.arange(len(nlines)), nlines)
+    j = np.arange(len(seg)) - np.repeat(np.cumsum(nlines) - nlines, nlines)
+    a = tess.offsets[seg] + 1 + j
+    return np.stack((a, a + 1), axis=1)
+
+
+def thick_lines(a, b, width):
+    ''' (n, 6, 2) triangle pairs covering the lines from a to b with the given width, like pr.draw_line_ex '''
+    d = b - a
+    length = np.hypot(d[:, 0], d[:, 1])
+    length[length == 0] = 1
+    n = np.stack((-d[:, 1], d[:, 0]), axis=1)*(width/2/length)[:, None]
+    return np.stack((a + n, a - n, b - n, a + n, b - n, b + n), axis=1)
+
+
+class Batch:
+    '''
+    Everything Curve draws in a frame as one triangle list with a colour per vertex, ready to be
+    copied to the GPU in one go. The buffers are kept and only grow, count says how much is used.
+    Positions have a z coordinate (always 0) because that's what meshes want.
+
+    groups holds the vertex offsets where runs of triangles start that have one colour and either
+    don't overlap or are opaque (the fill of one segment, all lines of one colour), so a rasterizer
+    can blend each run in one go and still get the same result.
+
+    With the shader fill, the first nfill vertices are one triangle of control points per segment,
+    which are only to be filled on the inout side of the curve, with texture coordinates (uv) that tell
+    where the curve is (see curve_uv). Everything after that has u = -1 and is drawn as is.
+    '''
+    def __init__(s):
+        s.pos = np.zeros((0, 3), np.float32)
+        s.col = np.zeros((0, 4), np.uint8)
+        s.uv = np.zeros((0, 2), np.float32)
+        s.count = 0
+        s.groups = np.zeros(1, int)
+        s.nfill = 0
+        s.inout = 0
+
+    def reserve(s, n):
+        if len(s.pos) < n:
+            s.pos = np.zeros((2*n, 3), np.float32)
+            s.col = np.zeros((2*n, 4), np.uint8)
+            s.uv = np.zeros((2*n, 2), np.float32)
+
+    def build(s, curve, inout, alpha, lines=False, lw=2, lw2=1, linecol=(255,255,255,255), ctrlcol=(0,0,0,255), fill='fans'):
+        ''' Fill triangles of all visible segments (see engine.Curve.cull), then if lines: the control lines and the curve itself.
+        fill: 'fans' for the triangle fans of the tessellated curve, 'shader' for one triangle per segment
+        that gets cut along the curve on the GPU (render.BezierShader), which doesn't need curve.tess
+        unless there are lines. '''
+        tess = curve.tess
+        vis = curve.visible # Only segments in view, tess has them in this order too
+        ctrl = curve.ctrl[vis]
+        seg_colours = curve.colours[vis]
+        if fill == 'shader':
+            seg = np.arange(len(vis))
+            parts = [(ctrl.reshape(-1, 2), seg, None)]
+        else:
+            tris, seg = fan_triangles(tess, inout)
+            parts = [(tess.verts[tris.ravel()], seg, None)]
+        if lines:
+            a = np.concatenate((ctrl[:, 0], ctrl[:, 1]))
+            b = np.concatenate((ctrl[:, 1], ctrl[:, 2]))
+            parts.append((thick_lines(a, b, lw2).reshape(-1, 2), None, ctrlcol))
+            pairs = polyline_pairs(tess)
+            parts.append((thick_lines(tess.verts[pairs[:, 0]], tess.verts[pairs[:, 1]], lw).reshape(-1, 2), None, linecol))
+
+        s.reserve(sum(len(p) for p, _, _ in parts))
+        s.count = 0
+        groups = [0]
+        for pos, seg, colour in parts:
+            end = s.count + len(pos)
+            s.pos[s.count:end, :2] = pos
+            if seg is not None:
+                s.col[s.count:end, :3] = seg_colours[np.repeat(seg, 3)]
+                s.col[s.count:end, 3] = alpha
+                groups.extend(s.count + np.cumsum(np.bincount(seg, minlength=len(vis))*3))
+            else:
+                s.col[s.count:end] = colour
+                groups.append(end)
+            s.count = end
+        s.groups = np.array(groups)
+        s.inout = inout
+        s.nfill = 3*len(vis) if fill == 'shader' else 0
+        if s.nfill:
+            s.uv[:s.nfill] = np.tile(curve_uv, (len(vis), 1))
+            s.uv[s.nfill:s.count] = -1
+        return s
@@ -0,0 +1,183 @@
+'''
+Benchmarks of the per-frame work, without a window: moving the curve, tessellating it, building the batch,
+drawing it (with the software backend, the GPU can't be timed like this) and handing the frame to the
+encoder. Sweeps curve length, open/closed, zoom and inout, and saves the results as JSON so runs of
+different versions can be compared:
+
+    python bench.py -o before.json
+    python bench.py -o after.json --compare before.json
+'''
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+import bez
+from raster import SoftwareBackend
+from writer import FrameWriter, Yuv420p
+
+def stats(ns):
+    ms = np.array(ns)/1e6
+    return {'mean': ms.mean(), 'p50': np.percentile(ms, 50), 'p95': np.percentile(ms, 95), 'max': ms.max()}
+
+
+class Frame:
+    ''' One frame the way bez.render_frames does it, split up into phases '''
+    def __init__(s, draw):
+        s.out = SoftwareBackend(bez.size) if draw else None
+        if draw:
+            convert = Yuv420p(bez.size) if bez.export_pix_fmt == 'yuv420p' else None
+            bez.rec.writer = FrameWriter(open(os.devnull, 'wb'), s.out.reader(), bez.export_queue, convert)
+
+    def phases(s):
+        yield 'move', bez.move_curve
+        yield 'update', lambda: bez.curve.update(bez.g.tol, tessellate=bez.curve_fill == 'fans' or bez.g.lines)
+        yield 'build', lambda: bez.batch.build(bez.curve, bez.g.inout, bez.opacity, bez.g.lines, bez.lw, bez.lw2,
+                                               bez.linecol, fill=bez.curve_fill)
+        if s.out is not None:
+            yield 'draw', s.draw
+            yield 'write', bez.rec.writeframe
+
+    def draw(s):
+        s.out.fill_rect((*bez.bgcol, 10))
+        s.out.draw_batch(bez.batch)
+
+    def close(s):
+        if s.out is not None:
+            with contextlib.redirect_stdout(io.StringIO()): # FrameWriter reports its throughput
+                bez.rec.writer.close()
+
+
+def setup(case, seed):
+    bez.rseed = seed
+    bez.g = bez.Globals()
+    vars(bez.g).update(case)
+    bez.reset()
+
+
+def run_case(case, frames, warmup, alloc_frames, draw, seed):
+    # Setting up the curve, which is mostly Curve.add_point and Curve.close
+    reset_ns = []
+    for _ in range(5):
+        t = time.perf_counter_ns()
+        setup(case, seed)
+        reset_ns.append(time.perf_counter_ns() - t)
+
+    frame = Frame(draw)
+    times = {}
+    visible = []
+    for i in range(warmup + frames):
+        for name, f in frame.phases():
+            t = time.perf_counter_ns()
+            f()
+            if i >= warmup:
+                times.setdefault(name, []).append(time.perf_counter_ns() - t)
+        visible.append(len(bez.curve.visible))
+
+    # Allocations in a separate pass, tracemalloc slows everything down
+    alloc = {}
+    tracemalloc.start()
+    for _ in range(alloc_frames):
+        for name, f in frame.phases():
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            f()
+            alloc[name] = alloc.get(name, 0) + tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    frame.close()
+
+    total = np.sum([times[name] for name in times], axis=0)
+    cpu = np.sum([times[name] for name in ('move', 'update', 'build')], axis=0)
+    return {
+        **case,
+        'segments': len(bez.curve.segs),
+        'visible': np.mean(visible[warmup:]), # Segments in view per frame, see engine.Curve.cull
+        'vertices': int(bez.batch.count),
+        'reset_ms': stats(reset_ns)['p50'],
+        'frame': stats(total),
+        'cpu': stats(cpu), # What the live loop does on the CPU before the GPU takes over
+        'phases': {name: {**stats(times[name]), 'alloc_kb': alloc[name]/alloc_frames/1e3} for name in times},
+    }
+
+
+def meta(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'commit': commit,
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpus': os.cpu_count(),
+        'size': bez.size,
+        'fps': bez.fps,
+        'frames': args.frames,
+        'draw': not args.no_draw,
+        'seed': args.seed,
+        'fill': args.fill,
+    }
+
+
+def key(case):
+    return case['clen'], case['close'], case['zoom'], case['inout'], case.get('boids', 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of an earlier run to compare the frame times with')
+    parser.add_argument('--clen', type=int, nargs='+', default=[3, 6, 12, 24, 48])
+    parser.add_argument('--frames', type=int, default=60, help='timed frames per case')
+    parser.add_argument('--warmup', type=int, default=10, help='frames per case before timing')
+    parser.add_argument('--alloc-frames', type=int, default=5, help='frames per case to count allocations in')
+    parser.add_argument('--no-draw', action='store_true', help='skip drawing and writing, which take most of the time')
+    parser.add_argument('--seed', type=float, default=0.5)
+    parser.add_argument('--boids', action='store_true', help='move the points as a flock, see boids.Flock')
+    parser.add_argument('--fill', default=bez.curve_fill, choices=('fans', 'shader'), help='see bez.curve_fill')
+    args = parser.parse_args()
+    bez.curve_fill = args.fill
+
+    old, field = {}, 'frame'
+    if args.compare:
+        with open(args.compare) as f:
+            prev = json.load(f)
+        old = {key(c): c for c in prev['cases']}
+        if prev['meta']['draw'] == args.no_draw:
+            field = 'cpu' # Only the CPU part was timed in both
+
+    budget = 1000/bez.fps
+    results = {'meta': meta(args), 'cases': []}
+    # Live, drawing happens on the GPU, so the headroom is what's left of the frame after the CPU part
+    print(f"{'clen':>4} {'close':>5} {'zoom':>4} {'inout':>5} {'segs':>5} {'vis':>5} {'frame':>8} {'frame p95':>9} "
+          f"{'cpu p95':>8} {'headroom':>8}  slowest phase")
+    for clen, close, zoom, inout in itertools.product(args.clen, (0, 1), (0, 1), (0, 1)):
+        case = {'clen': clen, 'close': close, 'zoom': zoom, 'inout': inout, 'boids': int(args.boids)}
+        r = run_case(case, args.frames, args.warmup, args.alloc_frames, not args.no_draw, args.seed)
+        results['cases'].append(r)
+        slowest = max(r['phases'], key=lambda name: r['phases'][name]['mean'])
+        line = (f"{clen:>4} {close:>5} {zoom:>4} {inout:>5} {r['segments']:>5} {r['visible']:>5.1f} {r['frame']['mean']:>6.2f}ms "
+                f"{r['frame']['p95']:>7.2f}ms {r['cpu']['p95']:>6.2f}ms {budget - r['cpu']['p95']:>6.2f}ms  {slowest}")
+        if key(r) in old:
+            line += f"  ({field} {r[field]['mean']/old[key(r)][field]['mean']:.2f}x {args.compare})"
+        print(line)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+
+if __name__ == '__main__':
+    main()
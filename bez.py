@@ -1,28 +1,65 @@
 import pyray as pr
 
-import numpy as np
 import random
 import datetime
+from fractions import Fraction
+import multiprocessing
+import os
 import subprocess
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
+import checkpoints
 import colours
+import features as audio_features
+import framering
+import session
+from batch import Batch
+from boids import Flock
+from clock import Clock
+from engine import Curve
+from raster import SoftwareBackend
+from render import RaylibBackend, draw_timings
+from tiles import TiledBackend
+from timing import FrameTimer
+from writer import FrameWriter, Yuv420p
 
 size = (1280, 800)
-fps = 60
+fps = 60 # Simulation steps per second, and the frame rate the window aims for
 lw = 2 #linewidth
 lw2 = 1
 bgcol = (255,255,255,255)
 linecol = (255,255,255,255)
 opacity = 12 # Set to 255 for normal opaque curves
-
-pr.set_trace_log_level(pr.LOG_WARNING | pr.LOG_ERROR)
-# pr.set_config_flags(pr.FLAG_MSAA_4X_HINT) # Enable anti-aliasing, but doesn't work when recording sadly
-pr.init_window(*size, 'bezziersz')
-pr.set_target_fps(fps)
+react_speed = 2 # With the music on (key: M) the points go up to this much faster again on the bass
+react_opacity = 1.5 # and the curve gets up to this much more opaque again on onsets (see features.py)
+curve_fill = 'fans' # Or 'shader' to cut one triangle per segment along the curve on the GPU, with smooth edges (see render.BezierShader)
+export_backend = 'raylib' # Or 'software' to render exports on the CPU with numpy, see raster.py
+export_workers = 1 # Render exports in chunks in this many processes at once, see Recorder.render_parallel
+export_fps = fps # Frame rate of exported videos, can be anything, the simulation still steps at fps (see clock.Clock)
+export_warmup = 3*export_fps # Frames drawn (but not written) before each chunk, so the fade out trails can build up
+export_queue = 4 # Frames that can wait for the encoder before drawing blocks, see writer.FrameWriter
+checkpoint_every = 10*fps # Steps between the snapshots of a recording in its .checkpoints file, for seeking in preview.py
+export_on_stop = True # Export right after recording, otherwise only save the session to render later with render_sessions.py
+export_size = size # Resolution of exported videos, e.g. (3840, 2400) for a 4K master of the same scene, see tiles.py
+export_supersample = 1 # Draw exports at this many times the resolution in each direction and average it down, for smooth edges
+export_tile = 2048 # Max width and height of the textures hi-res exports are drawn in, in pixels
+export_pix_fmt = 'yuv420p' # Frames go to ffmpeg as 'yuv420p' (converted with numpy, see writer.Yuv420p) or 'rgba'
+live_output = None # E.g. 'bezziersz' to publish every frame drawn in the window in shared memory under that name, see framering.py
+live_slots = 4 # Frames a reader of live_output can fall behind before it loses some
+live_pix_fmt = 'rgb0' # Or 'yuv420p', see export_pix_fmt. The alpha channel of the frames means nothing, hence rgb0
+timing_frames = 600 # Frames the timing stats (key: H) are taken over
+timing_dump = None # E.g. 'timings.csv' or 'timings.json' to time every frame and write the timings there on exit
+
+# Encoder settings for exports as (video options, audio codec, extension), choose with Recorder.preset
+presets = {
+    'x264': ('-c:v libx264 -crf 17 -pix_fmt yuv420p -preset veryslow -tune animation', 'copy', 'mp4'),
+    'x264_fast': ('-c:v libx264 -crf 20 -pix_fmt yuv420p -preset veryfast -tune animation', 'copy', 'mp4'),
+    'baseline': ('-c:v libx264 -profile:v baseline -level 3.0 -pix_fmt yuv420p', 'aac', 'mp4'),
+    'webm': ('-c:v libvpx', 'libopus', 'webm'),
+}
 
 rseed = random.random()
-print(f'seed: {rseed}') # For reproducibility
 
 
 
@@ -52,198 +89,66 @@ class Globals:
     ]
     speed = speeds[0]
     close = 1   # Open-ended or closed loop curve (key: T)
+    boids = 0   # Move the control points as a flock instead of in straight lines (key: B)
+    react = 0   # Let the music drive the speed and opacity, see react_speed and react_opacity (key: M)
+    tol = 0.5   # Max distance in pixels between the drawn polyline and the actual curve. Lower is smoother
+                # but slower, 0 always uses 64 points per segment (no key)
     def __init__(s):
         random.seed(rseed)
 
 g = Globals()
 
 
-def midpoint(p1, p2):
-    x = (p1[0] + p2[0])/2
-    y = (p1[1] + p2[1])/2
-    return (x, y)
-
-def add(p1, p2):
-    x = p1[0] + p2[0]
-    y = p1[1] + p2[1]
-    return (x, y)
-
-
-class Drawable:
-    def draw(s):
-        pr.draw_circle_gradient(int(s.pos[0]), int(s.pos[1]), 20, (255,255,255,255), (255,0,0,255))
-
-
-class Point(Drawable):
-    def __init__(s, pos):
-        s.pos = pos
-        s.speed = (random.gauss(0, g.speed[0]), random.gauss(0, g.speed[1]))
-
-    def move(s):
-        s.pos = add(s.pos, s.speed)
-
-
-class Midpoint(Drawable):
-    def __init__(s, a, b):
-        '''A point between a and b'''
-        s.a = a
-        s.b = b
-
-    @property
-    def pos(s):
-        return midpoint(s.a.pos, s.b.pos)
-
-
-class Line:
-    def __init__(s, start, end):
-        s.start = Point(start)
-        s.end = Point(end)
-
-    def draw(s):
-        pr.draw_line_ex(s.start.pos, s.end.pos, lw, (0,0,0,255))
-
-
-class Bezier:
-    def __init__(s, start, mid, end):
-        '''
-        Raylib lets us draw bezier lines easily, but since it doesn't support filled polylines or curves,
-        we still have to compute our own polyline anyway and draw it as a triangle fan. Since the fan
-        must be given in a specific order (cw or ccw), just store both of them at generation time and
-        draw both.
-        '''
-        s.complete = False
-        s.start = start
-        s.mid = mid
-        s.complete = True # set complete so the s.end assignment calls update_bezier_points
-        s.end = end
-
-        s.colour = colours.rand_from_palette(exclude=bgcol) + (opacity,)
-        s.colour2 = colours.rand_from_palette(exclude=bgcol) + (255,)
-        s.colour3 = colours.rand_from_palette(exclude=bgcol) + (255,)
-
-    @property
-    def points(s):
-        return (s.start, s.mid, s.end)
-
-    @property
-    def start(s):
-        return s._start
-
-    @start.setter
-    def start(s, val):
-        s._start = val
-        if s.complete:
-            s.update_bezier_points()
-
-    @property
-    def mid(s):
-        return s._mid
-
-    @mid.setter
-    def mid(s, val):
-        s._mid = val
-        if s.complete:
-            s.update_bezier_points()
-
-    @property
-    def end(s):
-        return s._end
-
-    @end.setter
-    def end(s, val):
-        s._end = val
-        if s.complete:
-            s.update_bezier_points()
-
-
-    def update_bezier_points(s):
-        ''' Manually calculate bezier points and store the resulting triangle fans for later drawing. '''
-        num = 64
-        ax, ay = s.start.pos
-        bx, by = s.mid.pos
-        cx, cy = s.end.pos
-        lin1x = np.linspace(ax, bx, num, True)
-        lin1y = np.linspace(ay, by, num, True)
-        lin2x = np.linspace(bx, cx, num, True)
-        lin2y = np.linspace(by, cy, num, True)
-        px = lin1x + (lin2x - lin1x)/(num-1)*np.arange(num)
-        py = lin1y + (lin2y - lin1y)/(num-1)*np.arange(num)
-        poly = np.dstack((px, py)).tolist()[0]
-
-
-        if g.inout == 0:
-            s.bezier_points = [s.mid.pos] + poly
-            s.bezier_points2 = [s.mid.pos] + poly[::-1]
-        elif g.inout == 1:
-            s.bezier_points = [] + poly
-            s.bezier_points2 = [] + poly[::-1]
-
-    def draw(s):
-        pr.draw_triangle_fan(s.bezier_points, len(s.bezier_points), s.colour)
-        pr.draw_triangle_fan(s.bezier_points2, len(s.bezier_points2), s.colour)
-        if g.lines == 1:
-            pr.draw_line_ex(s.start.pos, s.mid.pos, lw2, (0,0,0,255))
-            pr.draw_line_ex(s.mid.pos, s.end.pos, lw2, (0,0,0,255))
-            pr.draw_line_bezier_quad(s.start.pos, s.end.pos, s.mid.pos, lw, linecol)
-
-
-    def move(s):
-        for p in s.points:
-            if isinstance(p, Point):
-                p.move()
-
-
-class Curve:
-    ''' A collection of chained bezier curves '''
-    def __init__(s):
-        s.beziers = []
-
-    def draw(s):
-        for bez in s.beziers:
-            bez.draw()
-
-    def add_point(s, pos):
-        if not s.beziers:
-            s.beziers.append(Point(pos))
-        else:
-            last = s.beziers[-1]
-            if isinstance(last, Point):
-                s.beziers[-1] = Line(last.pos, pos)
-            elif isinstance(last, Line):
-                s.beziers[-1] = Bezier(last.start, last.end, Point(pos))
-            elif isinstance(last, Bezier):
-                mid = Midpoint(last.mid, last.end)
-                end = last.end
-                last.end = mid
-                s.beziers.append(Bezier(mid, end, Point(pos)))
-
-    def close(s):
-        first = s.beziers[0]
-        last = s.beziers[-1]
-        new_mid = first.start
-        mid_start = Midpoint(first.mid, new_mid)
-        mid_end = Midpoint(last.mid, new_mid)
-        first.start = mid_start
-        last.end = mid_end
-
-        s.beziers.append(Bezier(mid_start, new_mid, mid_end))
-
-    def reset(s):
-        s.beziers.clear()
-
-    def update(s):
-        for bez in s.beziers:
-            bez.update_bezier_points()
-
-    def move(s):
-        for bez in s.beziers:
-            bez.move()
-
-
-
-
-
-curve = Curve()
+batch = Batch()
+timer = FrameTimer(timing_frames, enabled=timing_dump is not None)
+hud = False # Show the timings on screen (key: H)
+
+def draw_curve(curve, out, opacity=opacity):
+    '''
+    Raylib lets us draw bezier lines easily, but since it doesn't support filled polylines or curves,
+    we still have to compute our own polyline anyway (Curve.update) and fill it with triangle fans.
+    All fans and lines of the whole curve go to the GPU as one batch.
+    '''
+    if not len(curve.segs):
+        # Not a curve yet, just a point or a line
+        pts = curve.nodes.tolist()
+        if len(pts) == 1:
+            out.draw_circle_gradient(pts[0], 20, (255,255,255,255), (255,0,0,255))
+        elif len(pts) == 2:
+            out.draw_line(pts[0], pts[1], lw, (0,0,0,255))
+        return
+    out.draw_batch(batch.build(curve, g.inout, opacity, g.lines, lw, lw2, linecol, fill=curve_fill))
+
+
+curve = Curve(view=(-lw, -lw, size[0] + 2*lw, size[1] + 2*lw)) # With some room for the lines
+flock = Flock()
+clock = Clock(fps) # Of the live simulation
+features = None # Of the audio of the recording, see load_features
+music_step = None # Step of the audio the last move was in, None when there's no music
+
+def load_features(audio):
+    ''' Analysed once per track and cached, see features.py '''
+    global features
+    if features is None or features.audio != audio:
+        features = audio_features.Features.load(audio, fps) if os.path.exists(audio) else None
+
+def music():
+    ''' Features of the music at music_step, all 0 without music '''
+    if not g.react or features is None:
+        return audio_features.Features.silent
+    return features.at(music_step)
+
+def move_curve(step=None):
+    ''' step: number of steps since the audio started, if it's playing, for the music to react to '''
+    global music_step
+    music_step = step
+    gain = 1 + react_speed*music()['bass']
+    if g.boids:
+        # Keep them in the area reset() puts them in
+        flock.bounds = (-size[0], -size[1], 2*size[0], 2*size[1]) if g.zoom else (0, 0, *size)
+        curve.move(flock, gain)
+    else:
+        curve.move(gain=gain)
 
 def reset(fixed_bg=True):
     ''' fixed_bg: always use the 1st colour of the palette for the background, and take other
@@ -259,14 +164,18 @@ def reset(fixed_bg=True):
         for _ in range(g.clen):
             x = random.randrange(-size[0], 2*size[0])
             y = random.randrange(-size[1], 2*size[1])
-            curve.add_point((x,y))
+            curve.add_point((x,y), g.speed, bgcol)
     else:
         for _ in range(g.clen):
             x = random.randrange(size[0])
             y = random.randrange(size[1])
-            curve.add_point((x,y))
+            curve.add_point((x,y), g.speed, bgcol)
     if g.close:
-        curve.close()
+        curve.close(bgcol)
+
+
+def timestamp():
+    return str(datetime.datetime.now()).replace(':','_').replace('-','_').replace(' ','_').split('.')[0]
 
 
 class Recorder:
@@ -274,95 +183,189 @@ class Recorder:
         s.recording = False
         s.t0 = 0
         s.events = deque()
+        s.sound = None
+        s.globals = session.params(Globals) # Parameters at the start of the recording
 
         s.audio = 'sound/brimble.mp3' # Set sound here!
-        s.fname = str(datetime.datetime.now()).replace(':','_').replace('-','_').replace(' ','_').split('.')[0]
-
-        # s.ffmpeg = f"ffmpeg -r {fps} -f rawvideo -pix_fmt rgba -s {size[0]}x{size[1]} -i - -an -c:v libvpx -y {s.fname}.webm"
-        # s.ffmpeg = f"ffmpeg -r {fps} -f rawvideo -pix_fmt rgba -s {size[0]}x{size[1]} -y -i - -c:v libx264 -profile:v baseline -level 3.0 -pix_fmt yuv420p {s.fname}.mp4"
-        s.ffmpeg = f"ffmpeg -r {fps} -f rawvideo -pix_fmt rgba -s {size[0]}x{size[1]} -y -i - -c:v libx264 -crf 17 -pix_fmt yuv420p -preset veryslow -tune animation {s.fname}.mp4"
+        s.fname = timestamp()
+
+        s.preset = 'x264' # See presets
+
+    def ffmpeg(s, fname, audio=True):
+        ''' Command that encodes raw frames from stdin to fname, and muxes in the audio in the same go. As
+        a list, without a shell, so paths can have spaces and quotes in them. '''
+        video, acodec, ext = presets[s.preset]
+        cmd = ['ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', export_pix_fmt, '-s', f'{export_size[0]}x{export_size[1]}',
+               '-r', f'{export_fps}', '-i', '-']
+        if audio:
+            cmd += ['-i', s.audio, '-map', '0:v', '-map', '1:a', '-c:a', acodec, '-shortest']
+        else:
+            cmd += ['-an']
+        return [*cmd, *video.split(), f'{fname}.{ext}']
 
     def start_recording(s):
         global g
         if not s.recording:
-            pr.init_audio_device()
+            # Everything that takes a while first
+            load_features(s.audio) # Already loaded by main, unless the track changed
+            if not pr.is_audio_device_ready():
+                pr.init_audio_device()
+            if s.sound is not None:
+                pr.unload_sound(s.sound) # Of the last recording
             s.sound = pr.load_sound(s.audio)
-            pr.play_sound(s.sound)
-
-            s.t0 = pr.get_time()
-            s.recording = True
-
             g = Globals()
+            s.globals = session.params(g)
             reset()
+            s.events.clear() # A new session
+            s.fname = timestamp() # Every recording gets its own session file
 
-    def writeframe(s):
-        img = pr.load_image_from_texture(s.texture.texture)
-        data_size = img.width * img.height * 4
-        img_bytes = pr.ffi.unpack(pr.ffi.cast("char*", img.data), data_size)
-        s.ffmpeg_process.stdin.write(img_bytes)
-        pr.unload_image(img) # Don't forget!
-
-    def replay(s):
-        global g
-        g = Globals()
-        reset()
+            pr.play_sound(s.sound)
+            s.t0 = clock.steps
+            s.recording = True
+            # The steps go on from when the sound started, so the stall doesn't put them (and the times
+            # of the keys) ahead of it
+            clock.resync(pr.get_time())
 
+    def stop_recording(s):
         pr.stop_sound(s.sound)
         s.recording = False
-        s.ffmpeg_process = subprocess.Popen(s.ffmpeg, stdin=subprocess.PIPE, shell=True)
+        session.save(f'{s.fname}.session.json', s.fname, rseed, s.globals, s.audio, s.events, size, fps)
+        print(f'{s.fname}.session.json')
+        live = snapshot()
+        s.restart()
+        build_checkpoints(s.schedule(), f'{s.fname}.checkpoints')
+        restore(live)
+        if export_on_stop:
+            s.replay()
+            exit()
+        s.events.clear()
+
+    def start_encoder(s, out, fname, audio=True):
+        s.ffmpeg_process = subprocess.Popen(s.ffmpeg(fname, audio), stdin=subprocess.PIPE)
+        convert = Yuv420p(export_size) if export_pix_fmt == 'yuv420p' else None
+        s.writer = FrameWriter(s.ffmpeg_process.stdin, out.reader(), export_queue, convert)
 
-        frame = 0
-        dobreak = False
-        # Have to render to texture because directly grabbing the screen results in stuttering.
-        # Unfortunately no anti-aliasing in this case.
-        s.texture = pr.load_render_texture(*size)
+    def writeframe(s):
+        s.writer.write()
+
+    def stop_encoder(s):
+        s.writer.close()
+        if s.ffmpeg_process.wait():
+            raise RuntimeError(f'ffmpeg exited with {s.ffmpeg_process.returncode}')
+
+    def schedule(s):
+        ''' The recorded keys to handle before each simulation step, up to and including the step in which
+        the recording was stopped '''
+        events = deque(s.events)
+        frames = []
         while True:
-            t = frame/fps
-
-            while t >= s.events[0][0]:
-                key = s.events.popleft()[1]
+            t = len(frames)/fps
+            keys = []
+            while events and t >= events[0][0]:
+                key = events.popleft()[1]
                 if key == 'stop!':
-                    dobreak = True
+                    events.clear()
                     break
-                s.handle_event(key)
-            
-            advance_frame(s.texture)
-            s.writeframe()
-            frame += 1
-            if dobreak:
-                break
-        pr.unload_render_texture(s.texture)
-        
-        s.ffmpeg_process.stdin.close()
-        s.ffmpeg_process.wait()
-
-        joined_fname = s.audio.split('.')[0].split('/')[-1]+'_'+s.fname+'.mp4'
-        proc2 = subprocess.Popen(f'ffmpeg -i {s.fname}.mp4 -i {s.audio} -c:v copy -c:a copy -shortest {joined_fname}', stdin=subprocess.PIPE, shell=True)
-        proc2.wait()
-        print(joined_fname)
+                keys.append(key)
+            frames.append(keys)
+            if not events:
+                return frames
 
-        exit()
+    def restart(s):
+        ''' Back to the scene the recording started with '''
+        global g
+        g = Globals()
+        vars(g).update(s.globals)
+        reset()
+        load_features(s.audio)
 
+    def replay(s):
+        ''' Render the recording again from the start and export it '''
+        s.restart()
+        if timing_dump and timer.frames:
+            timer.dump(timing_dump) # The live frames, the export gets its own file
+        timer.clear()
+
+        schedule = s.schedule()
+        joined_fname = s.audio.split('.')[0].split('/')[-1]+'_'+s.fname
+        if export_workers > 1:
+            s.render_parallel(schedule, joined_fname)
+        else:
+            s.render(schedule, joined_fname)
+        print(joined_fname)
+        if timing_dump:
+            root, ext = os.path.splitext(timing_dump)
+            timer.dump(f'{root}_export{ext}')
+
+    def render(s, schedule, fname):
+        out = export_target()
+        s.start_encoder(out, fname)
+        render_frames(out, schedule, 0, 0, export_frames(schedule))
+        s.stop_encoder()
+        out.unload()
+
+    def render_parallel(s, schedule, fname):
+        '''
+        Split the recording into export_workers chunks, render and encode them in separate processes and
+        glue the videos together, adding the audio. The simulation is cheap compared to drawing, so it's run once here
+        without drawing anything, taking a snapshot where each chunk has to start. Each chunk first draws
+        export_warmup frames it doesn't write, so the fade out trails have built up by its first frame.
+        Trails fade in 8 bit steps though, so very faint remains of older trails can differ slightly from
+        a serial render.
+        '''
+        n = export_frames(schedule)
+        chunk = -(-n//export_workers)
+        # Chunks of frames, by the simulation step they have to start from
+        firsts = {}
+        for start in range(0, n, chunk):
+            first = max(start - export_warmup, 0)
+            firsts.setdefault(Clock(fps).steps_at(Fraction(first, export_fps)), []).append((first, start))
+        jobs = []
+        for step in range(len(schedule) + 1):
+            for first, start in firsts.get(step, []):
+                jobs.append((first, start, min(start + chunk, n), schedule, snapshot(), export_settings(),
+                             f'{s.fname}_part{start//chunk:03d}'))
+            if step < len(schedule):
+                sim_step(schedule, step)
+
+        # Unlike a multiprocessing.Pool, this raises BrokenProcessPool when a worker dies instead of waiting for it
+        with ProcessPoolExecutor(export_workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = list(pool.map(render_chunk, jobs))
+
+        _, acodec, ext = presets[s.preset]
+        listfile = f'{s.fname}_parts.txt'
+        with open(listfile, 'w') as f:
+            for part in parts:
+                part = part.replace("'", "'\\''") # The list is quoted like a shell would
+                f.write(f"file '{part}'\n")
+        proc = subprocess.Popen(['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', listfile, '-i', s.audio,
+                                 '-map', '0:v', '-map', '1:a', '-c:v', 'copy', '-c:a', acodec, '-shortest', f'{fname}.{ext}'])
+        if proc.wait():
+            raise RuntimeError(f'ffmpeg failed to join {listfile} into {fname}.{ext}')
+        for part in parts:
+            os.remove(part)
+        os.remove(listfile)
 
     def now(s):
-        return pr.get_time() - s.t0
+        ''' Time of the next simulation step since the recording started, the keys pressed now go before it '''
+        return (clock.steps - s.t0)/fps
 
     def handle_event(s, key):
+        global hud
         rec_key = True
         if key == pr.KEY_LEFT_BRACKET:
             s.start_recording()
             rec_key = False # Don't record this one...
-        if key == pr.KEY_RIGHT_BRACKET:
+        if key == pr.KEY_RIGHT_BRACKET and s.recording:
             s.events.append((s.now(), "stop!"))
-            if s.recording:
-                s.replay()
+            s.stop_recording()
 
         match key:
             case pr.KEY_SPACE:
                 reset()
             case pr.KEY_Q:
                 g.inout = not g.inout
-                curve.update()
+                curve.update(g.tol)
             case pr.KEY_W:
                 g.lines = not g.lines
             case pr.KEY_E:
@@ -376,13 +379,17 @@ class Recorder:
                 i = g.speeds.index(g.speed)
                 g.speed = g.speeds[(i-1)%len(g.speeds)]
                 reset()
+            case pr.KEY_B:
+                g.boids = not g.boids
+            case pr.KEY_M:
+                g.react = not g.react
             case pr.KEY_T:
                 g.close = not g.close
                 reset()
             case pr.KEY_Y:
-                pts = [c.mid for c in curve.beziers]
+                pts = list(curve.segs[:, 1])
                 if not g.close:
-                    pts += [curve.beziers[0].start, curve.beziers[-1].end]
+                    pts += [curve.segs[0, 0], curve.segs[-1, 2]]
                 pt = random.choice(pts)
                 if g.zoom:
                     x = random.randrange(-size[0], 2*size[0])
@@ -390,7 +397,11 @@ class Recorder:
                 else:
                     x = random.randrange(size[0])
                     y = random.randrange(size[1])
-                pt.pos = (x, y)
+                curve.set_pos(pt, (x, y))
+            case pr.KEY_H:
+                hud = not hud
+                timer.enable(hud or timing_dump is not None)
+                rec_key = False # Doesn't change the picture
             case pr.KEY_MINUS:
                 g.clen -= 1
                 reset()
@@ -405,45 +416,264 @@ class Recorder:
 
 rec = Recorder()
 
-reset()
-
-def advance_frame(texture=None):
-    global curve
-    curve.move()
-    curve.update()
-
-    if texture:
-        pr.begin_texture_mode(texture)
-    else:
-        pr.begin_drawing()
-
+def snapshot():
+    ''' Everything needed to carry on the simulation from here, in another process if need be '''
+    return {
+        'g': vars(g).copy(),
+        'bgcol': bgcol,
+        'palette': colours.active_palette,
+        'random': random.getstate(),
+        'curve': curve.state(),
+        'audio': rec.audio,
+        'music_step': music_step,
+    }
+
+def restore(state):
+    global g, bgcol, music_step
+    g = Globals()
+    vars(g).update(state['g'])
+    load_features(state.get('audio', rec.audio))
+    music_step = state.get('music_step')
+    bgcol = state['bgcol']
+    colours.active_palette = state['palette']
+    random.setstate(state['random'])
+    curve.set_state(state['curve'])
+
+
+def open_export_window():
+    ''' The GPU backend still needs a window for its OpenGL context, but nobody has to see it '''
+    if export_backend != 'software':
+        pr.set_trace_log_level(pr.LOG_WARNING | pr.LOG_ERROR)
+        pr.set_config_flags(pr.FLAG_WINDOW_HIDDEN)
+        pr.init_window(*size, 'bezziersz export')
+
+def close_export_window():
+    if export_backend != 'software':
+        pr.close_window()
+
+
+def export_target():
+    if export_size != size or export_supersample > 1:
+        return tiled_export_target()
+    if export_backend == 'software':
+        return SoftwareBackend(size)
+    # Have to render to texture because directly grabbing the screen results in stuttering.
+    # Unfortunately no anti-aliasing in this case, unless supersampled.
+    return RaylibBackend(size, pr.load_render_texture(*size))
+
+def tiled_export_target():
+    assert export_size[0]*size[1] == export_size[1]*size[0], 'export_size needs the same aspect ratio as size'
+    zoom = export_size[0]*export_supersample/size[0]
+    def make_tile(tile_size, origin, zoom):
+        if export_backend == 'software':
+            return SoftwareBackend(tile_size, origin, zoom)
+        return RaylibBackend(tile_size, pr.load_render_texture(*tile_size), origin, zoom)
+    return TiledBackend(export_size, export_supersample, export_tile, make_tile, zoom)
+
+
+def sim_step(schedule, step):
+    ''' Take simulation step number step of a recording, see Recorder.schedule '''
+    for key in schedule[step]:
+        rec.handle_event(key)
+    move_curve(step)
+
+
+def build_checkpoints(schedule, path):
+    ''' Run a recording from its start without drawing anything, and save a snapshot every checkpoint_every
+    steps to path, see checkpoints.py '''
+    with checkpoints.Writer(path) as f:
+        for step in range(len(schedule)):
+            if step % checkpoint_every == 0:
+                f.add(step, snapshot())
+            sim_step(schedule, step)
+
+
+def export_frames(schedule):
+    ''' Number of frames of the export of a schedule (see Recorder.schedule) '''
+    return len(schedule)*export_fps//fps
+
+
+def render_frames(out, schedule, first, start, end):
+    '''
+    Draw the frames first until end of an export at export_fps, and write the ones from start on. The
+    simulation has to be at the state in which frame first starts: after Clock.steps_at(first/export_fps)
+    steps of the schedule.
+    '''
+    frames = Clock(fps)
+    frames.steps = frames.steps_at(Fraction(first, export_fps))
+    for frame in range(first, end):
+        timer.tick()
+        frames.time = Fraction(frame + 1, export_fps)
+        for _ in range(frames.due()):
+            sim_step(schedule, frames.steps)
+            frames.steps += 1
+        timer.lap('move')
+        draw_frame(out, frames.alpha(), rate=export_fps)
+        if frame >= start:
+            rec.writeframe()
+        timer.lap('write')
+
+
+# Settings render_chunk takes along to its worker, which imports this module afresh and would otherwise have
+# the defaults above instead of what was set at runtime, e.g. by render_sessions.py
+chunk_settings = ('export_backend', 'export_size', 'export_supersample', 'export_tile', 'export_fps', 'export_warmup',
+                  'export_pix_fmt', 'export_queue', 'curve_fill', 'opacity', 'react_opacity', 'lw', 'linecol')
+
+def export_settings():
+    return {name: globals()[name] for name in chunk_settings} | {'preset': rec.preset}
+
+def render_chunk(job):
+    ''' Render frames start until end to fname plus the extension of the preset, in a worker process of
+    Recorder.render_parallel, and return the name of the file. The state is the one frame first starts
+    from, the frames before start are only drawn to warm up the fade out trails. '''
+    first, start, end, schedule, state, settings, fname = job
+    settings = dict(settings)
+    rec.preset = settings.pop('preset')
+    globals().update(settings)
+    restore(state)
+    open_export_window()
+    out = export_target()
+    rec.start_encoder(out, fname, audio=False)
+    render_frames(out, schedule, first, start, end)
+    rec.stop_encoder()
+    out.unload()
+    close_export_window()
+    return f'{fname}.{presets[rec.preset][2]}'
+
+
+def load_session(path):
+    ''' Set up rec to replay a session saved by Recorder.stop_recording '''
+    global rseed
+    sess = session.load(path)
+    if tuple(sess['size']) != size or sess['fps'] != fps:
+        raise ValueError(f"{path} was recorded at {sess['size']} {sess['fps']}fps, set size and fps in bez.py to match")
+    rseed = sess['seed']
+    rec.fname = sess['name']
+    rec.globals = sess['globals']
+    rec.audio = sess['audio']
+    rec.events = deque(sess['events'])
+
+
+def render_session(path):
+    ''' Export a session saved by Recorder.stop_recording, without a (visible) window '''
+    load_session(path)
+    open_export_window()
+    rec.replay()
+    close_export_window()
+
+
+def per_frame(a, rate):
+    ''' Alpha that builds up as fast at rate frames per second as alpha a does at fps '''
+    return round(255*(1 - (1 - a/255)**(fps/rate)))
+
+
+def draw_frame(out, alpha=1, rate=fps):
+    ''' Draw one frame, out is a render backend (render.RaylibBackend or raster.SoftwareBackend). alpha:
+    between the last two simulation steps, see clock.Clock. rate: frames per second drawn, so the trails
+    fade just as fast at any frame rate. Anything drawn on top of it (see show) fades into the trails,
+    so overlays go on the copy in the window instead.
+    The phases are timed by timer, for raylib only the time it takes to hand the drawing to the GPU, the
+    GPU itself ends up in present, and in show for the window (with waiting for the next frame). '''
+    # tol is in pixels of the window, hi-res exports need it in pixels of the frame drawn
+    curve.update(g.tol/out.zoom, tessellate=curve_fill == 'fans' or g.lines, alpha=alpha)
+    timer.lap('update')
+
+    out.begin()
 
     # Swap these two lines to disable the fade out effect
-    # pr.clear_background(bgcol)
-    pr.draw_rectangle_v((0,0),size, (*bgcol,10))
-
-    curve.draw()
-
-    if texture:
-        pr.end_texture_mode()
-    else:
-        pr.end_drawing()
-
+    # out.clear(bgcol)
+    out.fill_rect((*bgcol, per_frame(10, rate)))
+    timer.lap('fade')
 
-while not pr.window_should_close():
+    draw_curve(curve, out, per_frame(min(opacity*(1 + react_opacity*music()['onset']), 255), rate))
+    timer.lap('draw')
 
-    if pr.is_mouse_button_pressed(pr.MOUSE_BUTTON_LEFT):
-        v = pr.get_mouse_position()
-        curve.add_point((v.x, v.y))
+    out.end()
+    timer.lap('present')
 
-    keys = []
-    while(key := pr.get_key_pressed()):
-        keys.append(key)
 
+def live_step(keys):
+    ''' The simulation part of a frame of main: handle the keys pressed since the last one, and take the
+    steps due by the time clock was ticked to '''
     for key in keys:
         rec.handle_event(key)
-     
-    advance_frame()
-
-
-pr.close_window()
+    timer.lap('events')
+
+    # If drawing can't keep up the motion stays in time anyway, with fewer frames
+    for _ in range(clock.due()):
+        move_curve(clock.steps - rec.t0 if rec.recording else None) # The music only plays while recording
+        clock.steps += 1
+    timer.lap('move')
+
+
+def live_writer(out):
+    ''' Publishes the frames drawn into out (a RaylibBackend with a render texture) to live_output '''
+    convert = Yuv420p(size) if live_pix_fmt == 'yuv420p' else None
+    frame_bytes = size[0]*size[1]*3//2 if convert is not None else None
+    ring = framering.FrameRing(live_output, size, live_slots, fps, live_pix_fmt, frame_bytes)
+    return FrameWriter(ring, out.reader(), export_queue, convert)
+
+def show(out, overlay=None):
+    ''' Put the frame drawn into out's render texture in the window '''
+    pr.begin_drawing()
+    pr.clear_background(pr.BLACK)
+    pr.begin_blend_mode(pr.BLEND_ALPHA_PREMULTIPLY) # Over black that's a plain copy, whatever the alpha
+    pr.draw_texture_rec(out.texture.texture, (0, 0, size[0], -size[1]), (0, 0), pr.WHITE)
+    pr.end_blend_mode()
+    if overlay is not None:
+        overlay()
+    pr.end_drawing()
+
+
+def main():
+    print(f'seed: {rseed}') # For reproducibility
+    reset()
+    load_features(rec.audio) # Now rather than when the recording starts, a new track takes a moment
+    pr.set_trace_log_level(pr.LOG_WARNING | pr.LOG_ERROR)
+    # pr.set_config_flags(pr.FLAG_MSAA_4X_HINT) # Enable anti-aliasing, but doesn't work when recording sadly
+    pr.init_window(*size, 'bezziersz')
+    pr.set_target_fps(fps)
+    # The picture builds up in a texture that's copied to the window with the overlay on top (see show), so
+    # the overlay doesn't end up in the trails. It's also what gets read back for live_output.
+    window = RaylibBackend(size, pr.load_render_texture(*size))
+    live = live_writer(window) if live_output else None
+    stats = {}
+
+    def overlay():
+        nonlocal stats
+        if timer.frames % 15 == 0 or not stats: # Percentiles of all phases every frame would show up in them
+            stats = timer.stats()
+        cull = curve.cull_stats()
+        draw_timings(stats, [f"{cull['visible']}/{cull['segments']} segments in view"])
+
+    while not pr.window_should_close():
+        timer.tick()
+        clock.tick_to(pr.get_time())
+
+        if pr.is_mouse_button_pressed(pr.MOUSE_BUTTON_LEFT):
+            v = pr.get_mouse_position()
+            curve.add_point((v.x, v.y), g.speed, bgcol)
+
+        keys = []
+        while(key := pr.get_key_pressed()):
+            keys.append(key)
+
+        live_step(keys)
+
+        draw_frame(window, clock.alpha())
+        if live is not None:
+            live.write()
+            timer.lap('publish')
+        show(window, overlay if hud else None)
+        timer.lap('show')
+
+    if live is not None:
+        live.close()
+    window.unload()
+    pr.close_window()
+    if timing_dump:
+        timer.dump(timing_dump)
+
+
+if __name__ == '__main__':
+    main()
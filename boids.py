@@ -0,0 +1,95 @@
+''' Flocking for the control points of a curve, see engine.Curve.move. '''
+import numpy as np
+
+
+def neighbours(pos, r):
+    '''
+    All pairs of points closer than r to each other, as index arrays i and j (both ways round, never i == j)
+    and the offsets pos[j] - pos[i]. A spatial hash: points are binned in r by r cells, the cells are hashed
+    into a table about twice the number of points, and each point only looks at the points in the buckets
+    of the 3x3 cells around its own. Cells that share a bucket just give some extra candidates that get
+    filtered out by distance, so it's about linear in the number of points as long as they don't all
+    crowd into a few cells.
+    '''
+    n = len(pos)
+    size = 1 << int(2*n - 1).bit_length()
+    cell = np.floor(pos/r).astype(np.int64)
+    cx = cell[:, 0, None] + np.array([-1, 0, 1, -1, 0, 1, -1, 0, 1])
+    cy = cell[:, 1, None] + np.array([-1, -1, -1, 0, 0, 0, 1, 1, 1])
+    buckets = ((cx*73856093) ^ (cy*19349663)) & (size - 1) # (n, 9), the own cell in the middle
+    own = buckets[:, 4]
+    order = np.argsort(own, kind='stable')
+    counts = np.bincount(own, minlength=size)
+    starts = np.cumsum(counts) - counts
+
+    buckets.sort(axis=1) # Visit every bucket once, even if some of the cells around share one
+    lo = starts[buckets]
+    num = counts[buckets]
+    num[:, 1:][buckets[:, 1:] == buckets[:, :-1]] = 0
+    num = num.ravel()
+    total = num.sum()
+    i = np.repeat(np.arange(n), num.reshape(n, 9).sum(axis=1))
+    j = order[np.repeat(lo.ravel() - (np.cumsum(num) - num), num) + np.arange(total)]
+    d = pos[j] - pos[i]
+    near = (i != j) & (d[:, 0]*d[:, 0] + d[:, 1]*d[:, 1] < r*r)
+    return i[near], j[near], d[near]
+
+
+def sums(i, v, n):
+    ''' Sum of the rows of v (m, 2) per index in i '''
+    return np.stack((np.bincount(i, v[:, 0], n), np.bincount(i, v[:, 1], n)), axis=1)
+
+
+class Flock:
+    '''
+    Boids: every point steers towards the average heading (alignment) and centre (cohesion) of the
+    points within radius, and away from the ones within personal space (separation). Near the edges of
+    bounds (x0, y0, x1, y1) they turn back in. Speeds are in pixels per frame.
+
+    With lots of points in bounds the radius shrinks so that there would be about `neighbours` points in
+    it if they were spread out evenly, and personal space shrinks with it, which keeps flocks from getting
+    so dense that every point has hundreds of neighbours. That keeps the cost per point about constant.
+    '''
+    def __init__(s, radius=60, personal=0.5, neighbours=8, cohesion=0.005, alignment=0.05, separation=0.5,
+                 min_speed=1, max_speed=4, bounds=(0, 0, 1280, 800), margin=50, turn=0.2):
+        s.radius = radius
+        s.personal = personal # As a fraction of the radius
+        s.neighbours = neighbours
+        s.cohesion = cohesion
+        s.alignment = alignment
+        s.separation = separation
+        s.min_speed = min_speed
+        s.max_speed = max_speed
+        s.bounds = bounds
+        s.margin = margin
+        s.turn = turn
+
+    def steer(s, pos, vel):
+        ''' Change the velocities vel (n, 2) of the points at pos in place '''
+        n = len(pos)
+        if not n:
+            return
+        x0, y0, x1, y1 = s.bounds
+        r = min(s.radius, np.sqrt(s.neighbours*(x1 - x0)*(y1 - y0)/(np.pi*n)))
+        i, j, d = neighbours(pos, r)
+        count = np.bincount(i, minlength=n)[:, None]
+        flocking = count[:, 0] > 0
+        acc = np.zeros((n, 2))
+        # Averages of the neighbours relative to the point itself
+        acc[flocking] += s.cohesion*sums(i, d, n)[flocking]/count[flocking]
+        acc[flocking] += s.alignment*(sums(i, vel[j], n)[flocking]/count[flocking] - vel[flocking])
+        # Pushed away harder the closer they get, with at most separation per neighbour
+        dist = np.sqrt(np.einsum('ij,ij->i', d, d))
+        space = s.personal*r
+        close = dist < space
+        push = (1/space - 1/np.maximum(dist[close], 1e-9))[:, None]*d[close]
+        acc += s.separation*sums(i[close], push, n)
+
+        m = s.margin
+        acc[:, 0] += s.turn*((pos[:, 0] < x0 + m).astype(float) - (pos[:, 0] > x1 - m))
+        acc[:, 1] += s.turn*((pos[:, 1] < y0 + m).astype(float) - (pos[:, 1] > y1 - m))
+        vel += acc
+
+        speed = np.hypot(vel[:, 0], vel[:, 1])
+        limit = np.clip(speed, s.min_speed, s.max_speed)
+        vel *= (limit/np.maximum(speed, 1e-9))[:, None]
@@ -0,0 +1,56 @@
+''' Files of simulation snapshots (bez.snapshot) with an index, to seek in recordings, see preview.py. '''
+import bisect
+import pickle
+import struct
+
+magic = b'BEZCKPT1'
+
+
+class Writer:
+    '''
+    Snapshots are pickled one after the other, followed by the index: a list of (step, file offset) of
+    each of them, and finally the offset of the index itself as 8 bytes. Add them in order of step.
+    '''
+    def __init__(s, path):
+        s.f = open(path, 'wb')
+        s.f.write(magic)
+        s.index = []
+
+    def add(s, step, state):
+        s.index.append((step, s.f.tell()))
+        pickle.dump(state, s.f, pickle.HIGHEST_PROTOCOL)
+
+    def close(s):
+        pos = s.f.tell()
+        pickle.dump(s.index, s.f, pickle.HIGHEST_PROTOCOL)
+        s.f.write(struct.pack('<Q', pos))
+        s.f.close()
+
+    def __enter__(s):
+        return s
+
+    def __exit__(s, *exc):
+        s.close()
+
+
+class Reader:
+    ''' Reads the index when opened, and a snapshot only when it's asked for, so it takes about as long
+    to get at one at the end of a long recording as at the start. '''
+    def __init__(s, path):
+        s.f = open(path, 'rb')
+        if s.f.read(len(magic)) != magic:
+            raise ValueError(f'{path} is not a checkpoint file')
+        s.f.seek(-8, 2)
+        s.f.seek(struct.unpack('<Q', s.f.read(8))[0])
+        index = pickle.load(s.f)
+        s.steps = [step for step, _ in index]
+        s.offsets = [offset for _, offset in index]
+
+    def at(s, step):
+        ''' (step, state) of the last snapshot at or before step '''
+        i = max(bisect.bisect_right(s.steps, step) - 1, 0)
+        s.f.seek(s.offsets[i])
+        return s.steps[i], pickle.load(s.f)
+
+    def close(s):
+        s.f.close()
@@ -0,0 +1,49 @@
+''' Fixed timestep simulation clock, see bez.main and bez.render_frames. '''
+import math
+
+
+class Clock:
+    '''
+    The simulation always takes steps of 1/rate seconds, no matter how often frames get drawn. Set (or
+    tick) the time that should be on screen, take due() steps to get there, and draw with alpha() to
+    interpolate between the last two steps, so the motion stays smooth and in time at any frame rate.
+    Steps are taken up to just past the time, alpha is 1 when it's exactly on a step.
+
+    For exports, set time to Fractions so frames line up with steps exactly, e.g. with the simulation
+    and the video both at 60 fps every frame is exactly one step, with alpha 1.
+    '''
+    def __init__(s, rate, max_dt=0.25):
+        s.rate = rate
+        s.max_dt = max_dt # Don't try to catch up with longer stalls than this, see tick
+        s.time = 0
+        s.steps = 0
+        s.wall = None # Of the last tick_to
+
+    def tick(s, dt):
+        ''' dt seconds have passed. After a long stall (loading, dragging the window) the simulation lags
+        behind instead of taking so many steps at once that the next frame stalls too. '''
+        s.time += min(dt, s.max_dt)
+
+    def tick_to(s, now):
+        ''' tick up to wall clock time now '''
+        if s.wall is not None:
+            s.tick(now - s.wall)
+        s.wall = now
+
+    def resync(s, now):
+        ''' Carry on from the last step at wall clock time now, leaving out whatever time passed since the
+        last tick_to. For stalls that something else has to stay in time with, like audio that only
+        started playing at the end of it. '''
+        s.time = s.steps/s.rate
+        s.wall = now
+
+    def due(s):
+        ''' Number of steps to take now '''
+        return max(math.ceil(s.time*s.rate) - s.steps, 0)
+
+    def alpha(s):
+        return float(min(max(1 - (s.steps - s.time*s.rate), 0), 1))
+
+    def steps_at(s, time):
+        ''' Steps taken after drawing at time '''
+        return math.ceil(time*s.rate)
@@ -0,0 +1,150 @@
+import random
+
+import numpy as np
+
+import colours
+from tess import Tessellator
+
+
+class Curve:
+    '''
+    A collection of chained bezier curves, stored as flat arrays instead of a graph of objects.
+
+    Every position the curve refers to is a node: either a control point that moves with its own speed,
+    or the midpoint of two other nodes. A segment is a triple of node indices (start, mid, end). Moving
+    the curve and resolving all midpoints is then a couple of array operations, no matter how long it is.
+    '''
+    def __init__(s, view=None):
+        ''' view: (x, y, w, h) of the visible area, segments outside it are culled by update() '''
+        s.tess = Tessellator()
+        s.view = view
+        s.reset()
+
+    def reset(s):
+        s.nodes = np.empty((0, 2))          # Positions of all nodes
+        s.level = np.empty(0, int)          # 0 for control points, 1 + level of the deepest parent for midpoints
+        s.points = np.empty(0, int)         # Node indices of the control points
+        s.speeds = np.empty((0, 2))         # Speed of each control point
+        s.mids = np.empty((0, 3), int)      # Rows of (node, a, b): node is the midpoint of nodes a and b
+        s.segs = np.empty((0, 3), int)      # Rows of (start, mid, end) node indices, one per bezier
+        s.colours = np.empty((0, 3), np.uint8)
+        s.ctrl = np.empty((0, 3, 2))        # Resolved (start, mid, end) positions, set by update()
+        s.visible = np.empty(0, int)        # Indices of the segments in view, set by update()
+        s.prev = None                       # nodes before the last move(), to interpolate between
+        s._groups = []
+
+    def state(s):
+        ''' Copies of the arrays that make up the curve, enough to carry on moving it elsewhere '''
+        state = {k: getattr(s, k).copy() for k in ('nodes', 'level', 'points', 'speeds', 'mids', 'segs', 'colours')}
+        state['prev'] = None if s.prev is None else s.prev.copy()
+        return state
+
+    def set_state(s, state):
+        for k, v in state.items():
+            setattr(s, k, None if v is None else v.copy())
+        s._groups = None
+
+    def add_node(s, pos, level=0):
+        s.prev = None
+        s.nodes = np.append(s.nodes, [pos], axis=0)
+        s.level = np.append(s.level, level)
+        return len(s.nodes) - 1
+
+    def add_control(s, pos, speed):
+        i = s.add_node(pos)
+        s.points = np.append(s.points, i)
+        s.speeds = np.append(s.speeds, [(random.gauss(0, speed[0]), random.gauss(0, speed[1]))], axis=0)
+        return i
+
+    def add_mid(s, a, b):
+        i = s.add_node((s.nodes[a] + s.nodes[b])/2, 1 + max(s.level[a], s.level[b]))
+        s.mids = np.append(s.mids, [(i, a, b)], axis=0)
+        s._groups = None
+        return i
+
+    def add_seg(s, start, mid, end, bgcol):
+        s.segs = np.append(s.segs, [(start, mid, end)], axis=0)
+        # Only the first colour is used, but keep drawing three so a seed still produces the same scene
+        cols = [colours.rand_from_palette(exclude=bgcol) for _ in range(3)]
+        s.colours = np.append(s.colours, [cols[0]], axis=0).astype(np.uint8)
+
+    def add_point(s, pos, speed, bgcol):
+        ''' speed: standard deviation of the random speed of the new point in x and y, bgcol: colour to avoid
+        for new segments '''
+        if len(s.segs):
+            # Split the last segment at the midpoint of its mid and end, and continue from there
+            start, mid, end = s.segs[-1]
+            new = s.add_control(pos, speed)
+            m = s.add_mid(mid, end)
+            s.segs[-1, 2] = m
+            s.add_seg(m, end, new, bgcol)
+        elif len(s.points) == 2:
+            new = s.add_control(pos, speed)
+            s.add_seg(s.points[0], s.points[1], new, bgcol)
+        elif len(s.points) == 1:
+            # A line gets two fresh points, the speed of the first one is rolled again
+            s.speeds[0] = (random.gauss(0, speed[0]), random.gauss(0, speed[1]))
+            s.add_control(pos, speed)
+        else:
+            s.add_control(pos, speed)
+
+    def close(s, bgcol):
+        if not len(s.segs):
+            return
+        new_mid = s.segs[0, 0]
+        mid_start = s.add_mid(s.segs[0, 1], new_mid)
+        mid_end = s.add_mid(s.segs[-1, 1], new_mid)
+        s.segs[0, 0] = mid_start
+        s.segs[-1, 2] = mid_end
+        s.add_seg(mid_start, new_mid, mid_end, bgcol)
+
+    def set_pos(s, node, pos):
+        s.nodes[node] = pos
+        s.prev = None # Jump there, don't slide
+
+    def resolve(s, nodes=None):
+        ''' Recompute all midpoints (of nodes, or s.nodes), level by level so midpoints of midpoints see up
+        to date parents. '''
+        if nodes is None:
+            nodes = s.nodes
+        if s._groups is None:
+            s._groups = [s.mids[s.level[s.mids[:, 0]] == lvl].T for lvl in range(1, s.level.max(initial=0) + 1)]
+        for node, a, b in s._groups:
+            nodes[node] = (nodes[a] + nodes[b])/2
+
+    def update(s, tol=0, tessellate=True, alpha=1):
+        ''' Manually calculate bezier points of all segments at once, see bez.draw_curve for why.
+        tol: max error of the polyline in pixels, see Tessellator. Without tessellate only the control
+        points are resolved, which is all the shader fill needs (see batch.Batch). alpha: where to draw
+        the curve between its position before the last move() (0) and now (1), see clock.Clock. '''
+        s.resolve()
+        nodes = s.nodes
+        if alpha < 1 and s.prev is not None:
+            s.resolve(s.prev)
+            nodes = s.prev + (nodes - s.prev)*alpha
+        s.ctrl = nodes[s.segs]
+        s.visible = s.cull(s.ctrl)
+        if tessellate:
+            s.tess.run(s.ctrl[s.visible], tol)
+
+    def cull(s, ctrl):
+        ''' Indices of the segments that can be in view. A quadratic bezier stays inside the triangle of
+        its control points, and so does the fill on either side of it, so a segment whose control points
+        are all beyond the same edge of the view can't be seen. '''
+        if s.view is None:
+            return np.arange(len(ctrl))
+        x, y, w, h = s.view
+        lo, hi = ctrl.min(axis=1), ctrl.max(axis=1)
+        return np.flatnonzero((hi[:, 0] >= x) & (lo[:, 0] <= x + w) & (hi[:, 1] >= y) & (lo[:, 1] <= y + h))
+
+    def cull_stats(s):
+        ''' How many segments the last update() drew and culled '''
+        return {'segments': len(s.segs), 'visible': len(s.visible), 'culled': len(s.segs) - len(s.visible)}
+
+    def move(s, flock=None, gain=1):
+        ''' flock: a boids.Flock to steer the control points with, otherwise they keep going straight.
+        gain: multiplies the distance they move this time '''
+        if flock is not None:
+            flock.steer(s.nodes[s.points], s.speeds)
+        s.prev = s.nodes.copy()
+        s.nodes[s.points] += s.speeds if gain == 1 else gain*s.speeds
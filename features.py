@@ -0,0 +1,170 @@
+''' What the music is doing at every simulation step, worked out once per track, see bez.move_curve. '''
+import argparse
+import hashlib
+import os
+import time
+
+import numpy as np
+import pyray as pr
+
+version = 1 # Bump when the analysis changes, so cached files get redone
+cache_dir = 'feature_cache' # Relative to where it runs, like the session files
+bands = {'bass': (20, 150), 'mid': (150, 2000), 'treble': (2000, 16000)} # Hz
+n_fft = 2048
+chunk = 1024 # Steps per batch of FFTs, to keep the (chunk, n_fft) arrays small
+min_bpm, max_bpm = 60, 200
+
+table = np.dtype([(name, '<f4') for name in bands] + [
+    ('onset', '<f4'), # Spectral flux, how much louder it got than the step before
+    ('beat', '<f4'),  # 1 on the step of a beat, 0 elsewhere
+    ('phase', '<f4'), # From 0 on a beat up to 1 on the next one
+])
+
+
+def decode(path):
+    ''' Mono samples of an audio file (anything raylib can load) as float32, and the sample rate '''
+    wave = pr.load_wave(path)
+    if not wave.frameCount:
+        raise ValueError(f"Couldn't load {path}")
+    n = wave.frameCount*wave.channels
+    ptr = pr.load_wave_samples(wave)
+    samples = np.frombuffer(pr.ffi.buffer(ptr, n*4), np.float32).reshape(-1, wave.channels).mean(axis=1)
+    pr.unload_wave_samples(ptr)
+    rate = wave.sampleRate
+    pr.unload_wave(wave)
+    return samples, rate
+
+
+def spectra(samples, rate, fps):
+    ''' Magnitude spectra around the time of every step, chunk steps at a time: (first step, (steps,
+    n_fft//2 + 1) array) pairs. The whole lot would take 4 KB per step, 1.5 GB for 40 minutes. '''
+    steps = int(len(samples)*fps//rate)
+    x = np.pad(samples, (n_fft//2, n_fft))
+    window = np.hanning(n_fft).astype(np.float32)
+    for i in range(0, steps, chunk):
+        # Windows centred on the steps, all gathered with one fancy index
+        centres = (np.arange(i, min(i + chunk, steps))*rate)//fps
+        frames = x[centres[:, None] + np.arange(n_fft)]
+        yield i, np.abs(np.fft.rfft(frames*window, axis=1)).astype(np.float32)
+
+
+def normalize(v):
+    ''' Roughly 0 to 1, so the settings that use them work the same for loud and quiet tracks '''
+    top = np.percentile(v, 99) if len(v) else 0
+    return np.clip(v/top, 0, 1) if top > 0 else np.zeros_like(v)
+
+
+def beats(onset, fps):
+    '''
+    Steps on which the beats fall. The tempo is the lag with the strongest autocorrelation of the onsets
+    (within min_bpm to max_bpm), the first beat is the offset where the onsets line up best with that
+    period, and from there every beat is looked for near where the last one says it should be, so it
+    can follow the track drifting a little.
+    '''
+    n = len(onset)
+    lo, hi = int(fps*60/max_bpm), int(fps*60/min_bpm)
+    if n < 2*hi:
+        return np.empty(0, int)
+    o = onset - onset.mean()
+    spec = np.fft.rfft(o, 2*n)
+    corr = np.fft.irfft(spec*np.conj(spec))[:n]
+    period = lo + int(np.argmax(corr[lo:hi + 1]))
+    grid = np.pad(onset, (0, -n % period)).reshape(-1, period).sum(axis=0)
+    found = [int(np.argmax(grid))]
+    slack = max(period//8, 1)
+    while (guess := found[-1] + period) < n:
+        a, b = guess - slack, min(guess + slack + 1, n)
+        found.append(a + int(np.argmax(onset[a:b])))
+    return np.array(found)
+
+
+def analyse(samples, rate, fps):
+    ''' The features (see table) for every step of fps per second. Only the band energies and flux of
+    the spectra are kept, worked out a chunk of them at a time. '''
+    steps = int(len(samples)*fps//rate)
+    out = np.zeros(steps, table)
+    freqs = np.fft.rfftfreq(n_fft, 1/rate)
+    weights = np.stack([(freqs >= lo) & (freqs < hi) for lo, hi in bands.values()], axis=1).astype(np.float32)
+    energy = np.empty((steps, len(bands)), np.float32)
+    flux = np.empty(steps, np.float32)
+    last = None # Log spectrum of the step before the chunk
+    for i, mag in spectra(samples, rate, fps):
+        energy[i:i + len(mag)] = np.log1p(np.matmul(mag**2, weights))
+        logmag = np.log1p(mag)
+        diff = np.diff(logmag, axis=0, prepend=logmag[:1] if last is None else last) # The first step has none
+        flux[i:i + len(mag)] = np.maximum(diff, 0).sum(axis=1)
+        last = logmag[-1:]
+    for i, name in enumerate(bands):
+        out[name] = normalize(energy[:, i])
+    out['onset'] = normalize(flux)
+
+    found = beats(out['onset'], fps)
+    out['beat'][found] = 1
+    if len(found) > 1:
+        step = np.arange(steps)
+        i = np.clip(np.searchsorted(found, step, side='right') - 1, 0, len(found) - 2)
+        out['phase'] = np.clip((step - found[i])/(found[i + 1] - found[i]), 0, 1)
+    return out
+
+
+def file_hash(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        while block := f.read(1 << 20):
+            h.update(block)
+    return h.hexdigest()
+
+
+class Features:
+    '''
+    The features of a track at fps steps per second, as a table (see table) with a row per step, memory
+    mapped from a .npy file in cache_dir named after the hash of the audio file. Only the first load of
+    a track decodes and analyses it, after that it's just the hash.
+    '''
+    silent = np.zeros((), table)[()]
+
+    def __init__(s, audio, rows):
+        s.audio = audio
+        s.rows = rows
+
+    @classmethod
+    def load(cls, audio, fps):
+        path = os.path.join(cache_dir, f'{file_hash(audio)}_{fps}fps_v{version}.npy')
+        if not os.path.exists(path):
+            samples, rate = decode(audio)
+            rows = analyse(samples, rate, fps)
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = f'{path}.{os.getpid()}.tmp' # Other renders of the same track may be at it too
+            with open(tmp, 'wb') as f:
+                np.save(f, rows)
+            os.replace(tmp, path)
+        return cls(audio, np.load(path, mmap_mode='r'))
+
+    def __len__(s):
+        return len(s.rows)
+
+    def at(s, step):
+        ''' Features at step since the track started, all 0 before and after it '''
+        if step is None or not 0 <= step < len(s.rows):
+            return s.silent
+        return s.rows[step]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse tracks ahead of time into the cache, so starting a "
+                                                 "recording in bez.py doesn't have to wait for it")
+    parser.add_argument('audio', nargs='+', help='audio files')
+    parser.add_argument('--fps', type=int, help='simulation steps per second (default: bez.fps)')
+    args = parser.parse_args()
+    pr.set_trace_log_level(pr.LOG_WARNING | pr.LOG_ERROR)
+    if args.fps is None:
+        import bez
+        args.fps = bez.fps
+    for audio in args.audio:
+        t = time.perf_counter()
+        rows = Features.load(audio, args.fps)
+        print(f'{audio}: {len(rows)} steps at {args.fps} fps, {time.perf_counter() - t:.1f}s')
+
+
+if __name__ == '__main__':
+    main()
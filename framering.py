@@ -0,0 +1,192 @@
+''' Live frames in shared memory for other processes on the same machine, see bez.live_output. Run as a
+script to record them to a file or through ffmpeg. '''
+import argparse
+import subprocess
+import sys
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+magic = b'BEZRING1'
+header = np.dtype([('magic', 'S8'), ('width', '<u4'), ('height', '<u4'), ('slots', '<u4'), ('frame_bytes', '<u4'),
+                   ('fps', '<f8'), ('pix_fmt', 'S16'), ('latest', '<u8'), ('closed', '<u8')])
+slot = np.dtype([('seq', '<u8'), ('time', '<f8')])
+align = 64
+
+
+def layout(slots):
+    ''' Offsets of the slot headers and of the first frame '''
+    slots_at = -(-header.itemsize//align)*align
+    return slots_at, -(-(slots_at + slots*slot.itemsize)//align)*align
+
+
+class FrameRing:
+    '''
+    A ring of slots for frames in shared memory, with one writer and any number of readers, and no locks:
+    the writer never waits for anyone, readers that fall more than slots frames behind lose frames.
+
+    The block starts with a header (see header: size, pixel format, and the sequence number of the
+    latest complete frame), then a (seq, time) pair per slot, then the frames. Frame n (counting from 1)
+    goes in slot n % slots. The writer sets its seq to 2n - 1 while it copies the pixels in and to 2n
+    when it's done, so a reader can tell whether a slot holds a complete frame n, and whether it still
+    does after reading it (otherwise the writer came round again and what it read is torn).
+    '''
+    def __init__(s, name, size=None, slots=4, fps=60, pix_fmt='rgb0', frame_bytes=None):
+        ''' Create it if given a size, otherwise attach to an existing one (see Reader) '''
+        s.name = name
+        s.owner = size is not None
+        if s.owner:
+            frame_bytes = frame_bytes or size[0]*size[1]*4
+            slots_at, frames_at = layout(slots)
+            nbytes = frames_at + slots*frame_bytes
+            try:
+                s.shm = shared_memory.SharedMemory(name, create=True, size=nbytes)
+            except FileExistsError: # Left over from a run that crashed
+                shared_memory.SharedMemory(name).unlink()
+                s.shm = shared_memory.SharedMemory(name, create=True, size=nbytes)
+            s.head = np.ndarray((), header, s.shm.buf)
+            s.head[()] = (magic, size[0], size[1], slots, frame_bytes, fps, pix_fmt.encode(), 0, 0)
+        else:
+            s.shm = shared_memory.SharedMemory(name)
+            # Before 3.13 the resource tracker would unlink it when a reader exits, under the writer's feet
+            resource_tracker.unregister(s.shm._name, 'shared_memory')
+            s.head = np.ndarray((), header, s.shm.buf)
+            if s.head['magic'].item() != magic:
+                raise ValueError(f'{name} is not a frame ring')
+        s.slots = int(s.head['slots'])
+        s.frame_bytes = int(s.head['frame_bytes'])
+        slots_at, frames_at = layout(s.slots)
+        s.slot = np.ndarray((s.slots,), slot, s.shm.buf, slots_at)
+        s.frames = np.ndarray((s.slots, s.frame_bytes), np.uint8, s.shm.buf, frames_at)
+        s.seq = int(s.head['latest'])
+
+    @property
+    def size(s):
+        return int(s.head['width']), int(s.head['height'])
+
+    @property
+    def fps(s):
+        return float(s.head['fps'])
+
+    @property
+    def pix_fmt(s):
+        return s.head['pix_fmt'].item().decode()
+
+    def write(s, buf):
+        ''' Publish the next frame, buf has frame_bytes bytes. The same as a file's write so it can go in a
+        writer.FrameWriter. '''
+        n = s.seq + 1
+        i = n % s.slots
+        s.slot['seq'][i] = 2*n - 1
+        s.frames[i] = np.frombuffer(buf, np.uint8)
+        s.slot['time'][i] = time.time()
+        s.slot['seq'][i] = 2*n
+        s.head['latest'] = n
+        s.seq = n
+
+    def close(s):
+        ''' Readers can still read what's there, the memory goes away once they've let go of it too '''
+        if s.owner:
+            s.head['closed'] = 1
+        s.head = s.slot = s.frames = None # Views on the memory have to go before it can be closed
+        s.shm.close()
+        if s.owner:
+            s.shm.unlink()
+
+
+class Reader:
+    ''' Follows the frames of a FrameRing '''
+    def __init__(s, ring):
+        s.ring = ring
+        s.last = int(ring.head['latest']) # Start with the next one
+        s.dropped = 0
+
+    def view(s, n):
+        ''' Frame n without copying, or None if it's not (or no longer) there. Check valid(n) after using it. '''
+        i = n % s.ring.slots
+        if s.ring.slot['seq'][i] != 2*n:
+            return None
+        return s.ring.frames[i]
+
+    def valid(s, n):
+        return s.ring.slot['seq'][n % s.ring.slots] == 2*n
+
+    def next(s, out, poll=0.001):
+        ''' Copy the frame after the last one read into out (or the oldest one still there if that's
+        gone, counting the ones missed in dropped) and return its sequence number. Waits for it if it's
+        not there yet, returns None once the writer has closed. '''
+        while True:
+            latest = int(s.ring.head['latest'])
+            if latest > s.last:
+                n = max(s.last + 1, latest - s.ring.slots + 1)
+                frame = s.view(n)
+                if frame is not None:
+                    np.copyto(out, frame)
+                    if s.valid(n):
+                        s.dropped += n - s.last - 1
+                        s.last = n
+                        return n
+                s.dropped += n - s.last # Overwritten while we were at it, skip it
+                s.last = n
+                continue
+            if s.ring.head['closed']:
+                return None
+            time.sleep(poll)
+
+
+def attach(name, wait=True, poll=0.1):
+    ''' The FrameRing name, waiting for the writer to start if need be '''
+    while True:
+        try:
+            return FrameRing(name)
+        except FileNotFoundError:
+            if not wait:
+                raise
+            time.sleep(poll)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record the frames bez.py publishes with live_output set, until it stops')
+    parser.add_argument('name', help='name of the shared memory, bez.live_output')
+    parser.add_argument('-o', '--out', default='live.mp4',
+                        help="file to encode to with ffmpeg, or .raw for the frames as they are, or - for stdout (default: live.mp4)")
+    parser.add_argument('--ffmpeg', default='-c:v libx264 -preset veryfast -crf 18 -pix_fmt yuv420p',
+                        help='ffmpeg output options')
+    args = parser.parse_args()
+
+    ring = attach(args.name)
+    w, h = ring.size
+    print(f'{args.name}: {w}x{h} {ring.pix_fmt} at {ring.fps:g} fps', file=sys.stderr)
+    proc = None
+    if args.out == '-':
+        f = sys.stdout.buffer
+    elif args.out.endswith('.raw'):
+        f = open(args.out, 'wb')
+    else:
+        # Frames come as often as the window draws them, which is fps unless it can't keep up
+        cmd = ['ffmpeg', '-y', '-f', 'rawvideo', '-pix_fmt', ring.pix_fmt, '-s', f'{w}x{h}', '-r', f'{ring.fps:g}',
+               '-i', '-', *args.ffmpeg.split(), args.out]
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        f = proc.stdin
+
+    reader = Reader(ring)
+    buf = np.empty(ring.frame_bytes, np.uint8)
+    frames = 0
+    try:
+        while reader.next(buf) is not None:
+            f.write(buf.data)
+            frames += 1
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if f is not sys.stdout.buffer:
+            f.close()
+        if proc is not None:
+            proc.wait()
+        ring.close()
+    print(f'{frames} frames, {reader.dropped} dropped', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+''' Play back a saved session (see bez.Recorder.stop_recording) with its audio, and seek around in it. '''
+import argparse
+import os
+
+import pyray as pr
+
+import bez
+import checkpoints
+from clock import Clock
+from render import RaylibBackend
+
+skip = 5 # Seconds for LEFT and RIGHT
+skip_far = 60 # Seconds for DOWN and UP
+bar = 10 # Height of the timeline at the bottom, in pixels
+warm = 3*bez.fps # Steps drawn up to the time seeked to, so the fade out trails are there, like bez.export_warmup
+
+
+class Preview:
+    '''
+    Seeking restores the last checkpoint before the time, runs the simulation from there without
+    drawing (which is quick), clears the picture and draws the last warm steps as fast as possible, the
+    way the chunks of a parallel export warm up. Everything is drawn into a render texture which is
+    copied to the window every frame (see bez.show), so while paused the picture stays as it is and the
+    timeline on top of it doesn't end up in the trails.
+    '''
+    def __init__(s, schedule, ckpts, window):
+        s.schedule = schedule
+        s.ckpts = ckpts
+        s.window = window
+        s.clock = Clock(bez.fps)
+        s.playing = False
+        s.music = None
+        if os.path.exists(bez.rec.audio):
+            pr.init_audio_device()
+            s.music = pr.load_music_stream(bez.rec.audio)
+
+    def length(s):
+        return len(s.schedule)/bez.fps
+
+    def seek(s, time):
+        target = min(max(round(time*bez.fps), 0), len(s.schedule))
+        start = max(target - warm, 0)
+        step, state = s.ckpts.at(start)
+        bez.restore(state)
+        for step in range(step, start):
+            bez.sim_step(s.schedule, step)
+        s.window.begin()
+        s.window.clear(bez.bgcol)
+        s.window.end()
+        for step in range(start, target):
+            bez.sim_step(s.schedule, step)
+            bez.draw_frame(s.window)
+        s.clock.steps = target
+        s.clock.resync(pr.get_time()) # Not counting the time it took to get there
+        if s.music is not None:
+            pr.seek_music_stream(s.music, s.clock.time)
+
+    def play(s, on):
+        s.playing = on and s.clock.steps < len(s.schedule)
+        if s.playing:
+            s.clock.resync(pr.get_time()) # From where it was paused
+        if s.music is None:
+            return
+        if s.playing and not pr.is_music_stream_playing(s.music):
+            pr.play_music_stream(s.music)
+            pr.seek_music_stream(s.music, s.clock.time)
+        elif not s.playing:
+            pr.pause_music_stream(s.music)
+
+    def handle_input(s):
+        time = s.clock.steps/bez.fps
+        while (key := pr.get_key_pressed()):
+            match key:
+                case pr.KEY_SPACE:
+                    s.play(not s.playing)
+                case pr.KEY_LEFT:
+                    s.seek(time - skip)
+                case pr.KEY_RIGHT:
+                    s.seek(time + skip)
+                case pr.KEY_DOWN:
+                    s.seek(time - skip_far)
+                case pr.KEY_UP:
+                    s.seek(time + skip_far)
+        pos = pr.get_mouse_position()
+        if pr.is_mouse_button_down(pr.MOUSE_BUTTON_LEFT) and pos.y >= bez.size[1] - 3*bar:
+            # Scrub: keep seeking while dragging, paused so it doesn't run off
+            if s.playing:
+                s.play(False)
+            time = pos.x/bez.size[0]*s.length()
+            if round(time*bez.fps) != s.clock.steps: # Every seek draws warm frames, not while holding still
+                s.seek(time)
+
+    def step(s):
+        if not s.playing:
+            return
+        s.clock.tick_to(pr.get_time())
+        for _ in range(s.clock.due()):
+            if s.clock.steps >= len(s.schedule):
+                s.play(False)
+                s.clock.time = s.clock.steps/bez.fps
+                break
+            bez.sim_step(s.schedule, s.clock.steps)
+            s.clock.steps += 1
+
+    def overlay(s):
+        w, h = bez.size
+        time = s.clock.steps/bez.fps
+        pr.draw_rectangle(0, h - bar, w, bar, (0,0,0,120))
+        pr.draw_rectangle(0, h - bar, round(w*time/max(s.length(), 1e-9)), bar, (255,255,255,200))
+        text = f'{time//60:.0f}:{time%60:04.1f} / {s.length()//60:.0f}:{s.length()%60:04.1f}'
+        pr.draw_text(text + ('' if s.playing else '  paused'), 10, h - bar - 30, 20, pr.WHITE)
+
+    def run(s):
+        s.seek(0)
+        while not pr.window_should_close():
+            if s.music is not None:
+                pr.update_music_stream(s.music)
+            s.handle_input()
+            if s.playing:
+                s.step()
+                bez.draw_frame(s.window, s.clock.alpha())
+            bez.show(s.window, s.overlay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     epilog='Keys: space play/pause, left/right -/+5s, down/up -/+60s, click or drag the bar at the bottom to jump there')
+    parser.add_argument('session', help='.session.json file')
+    args = parser.parse_args()
+
+    bez.load_session(args.session)
+    bez.rec.restart()
+    schedule = bez.rec.schedule()
+    path = os.path.join(os.path.dirname(args.session), f'{bez.rec.fname}.checkpoints')
+    if not os.path.exists(path): # Sessions from before there were checkpoints
+        bez.build_checkpoints(schedule, path)
+    ckpts = checkpoints.Reader(path)
+
+    pr.set_trace_log_level(pr.LOG_WARNING | pr.LOG_ERROR)
+    pr.init_window(*bez.size, 'bezziersz preview')
+    pr.set_target_fps(bez.fps)
+    window = RaylibBackend(bez.size, pr.load_render_texture(*bez.size))
+    Preview(schedule, ckpts, window).run()
+    window.unload()
+    ckpts.close()
+    pr.close_window()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+''' Pure numpy stand-in for the raylib drawing we do, for rendering without a display or GPU. '''
+import queue
+
+import numpy as np
+
+from batch import thick_lines
+
+
+def coverage(tris, size):
+    '''
+    Pixels whose centre lies inside any of the triangles (n, 3, 2), as (x0, y0, mask) where mask is a bool
+    array for the pixels from (x0, y0) on, or None if nothing is covered. Scanline style: every edge adds
+    +1 or -1 at the first pixel right of where it crosses a row, with the sign flipped for clockwise
+    triangles so they all count the same way, and a running sum along each row is nonzero inside.
+    '''
+    w, h = size
+    a, b, c = tris[:, 0], tris[:, 1], tris[:, 2]
+    area = (b[:, 0] - a[:, 0])*(c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1])*(c[:, 0] - a[:, 0])
+    tris = tris[area != 0]
+    if not len(tris):
+        return None
+    lo, hi = tris.min(axis=(0, 1)), tris.max(axis=(0, 1))
+    x0, y0 = np.clip(np.ceil(lo - 0.5).astype(int), 0, size)
+    x1, y1 = np.clip(np.ceil(hi - 0.5).astype(int), 0, size)
+    if x1 <= x0 or y1 <= y0:
+        return None
+
+    p = tris.reshape(-1, 2)
+    q = tris[:, [1, 2, 0]].reshape(-1, 2)
+    down = q[:, 1] > p[:, 1]
+    weight = np.where(down, 1, -1)*np.repeat(np.sign(area[area != 0]), 3).astype(int)
+    top = np.where(down[:, None], p, q)
+    bottom = np.where(down[:, None], q, p)
+    # Rows whose centre is in [top, bottom)
+    r0 = np.clip(np.ceil(top[:, 1] - 0.5).astype(int), y0, y1)
+    r1 = np.clip(np.ceil(bottom[:, 1] - 0.5).astype(int), y0, y1)
+    counts = r1 - r0
+    edge = np.repeat(np.arange(len(p)), counts)
+    row = r0[edge] + np.arange(len(edge)) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = (row + 0.5 - top[edge, 1])/(bottom[edge, 1] - top[edge, 1])
+    x = top[edge, 0] + t*(bottom[edge, 0] - top[edge, 0])
+    col = np.clip(np.ceil(x - 0.5).astype(int), x0, x1)
+
+    cw, ch = x1 - x0, y1 - y0
+    diff = np.bincount((row - y0)*(cw + 1) + col - x0, weight[edge], ch*(cw + 1)).reshape(ch, cw + 1)
+    mask = np.cumsum(diff, axis=1)[:, :cw] != 0
+    return x0, y0, mask
+
+
+def curve_side(tri, uv, inout, x0, y0, mask):
+    ''' Narrow down the coverage of a single triangle to one side of the curve, the same way
+    render.BezierShader does per pixel: interpolate the texture coordinates uv of the corners to the
+    pixel centres, the control point side is where u^2 - v > 0. '''
+    ys, xs = np.nonzero(mask)
+    a, b, c = tri
+    m = np.linalg.inv(np.stack((b - a, c - a), axis=1))
+    st = m @ np.stack((xs + x0 + 0.5 - a[0], ys + y0 + 0.5 - a[1]))
+    u, v = uv[0, :, None] + (uv[1] - uv[0])[:, None]*st[0] + (uv[2] - uv[0])[:, None]*st[1]
+    f = u*u - v
+    keep = f < 0 if inout else f >= 0
+    mask = mask.copy()
+    mask[ys[~keep], xs[~keep]] = False
+    return x0, y0, mask
+
+
+def blend(img, colour, x0=0, y0=0, mask=None):
+    ''' Alpha blend colour onto img like the GPU does with raylib's default blend mode: every channel,
+    alpha included, becomes src*a + dst*(1 - a), rounded back to 8 bits. '''
+    src = np.array(colour, np.float32)
+    a = src[3]/255
+    if mask is None:
+        region = img
+        px = img.astype(np.float32)
+    else:
+        region = img[y0:y0 + mask.shape[0], x0:x0 + mask.shape[1]]
+        px = region[mask].astype(np.float32)
+    out = np.rint(src*a + px*(1 - a)).astype(np.uint8)
+    if mask is None:
+        region[:] = out
+    else:
+        region[mask] = out
+
+
+class SoftwareBackend:
+    '''
+    Renders into an RGBA numpy array instead of the window, for offline rendering on machines
+    without a display or GPU. Same interface as render.RaylibBackend, origin and zoom included.
+    '''
+    def __init__(s, size, origin=(0, 0), zoom=1):
+        s.size = size
+        s.origin = np.array(origin, float)
+        s.zoom = zoom
+        s.img = np.zeros((size[1], size[0], 4), np.uint8)
+
+    def to_pixels(s, p):
+        return (p - s.origin)*s.zoom
+
+    def begin(s):
+        pass
+
+    def end(s):
+        pass
+
+    def clear(s, colour):
+        s.img[:] = colour
+
+    def fill_rect(s, colour):
+        blend(s.img, colour)
+
+    def fill_triangles(s, tris, colour):
+        cov = coverage(tris, s.size)
+        if cov is not None:
+            blend(s.img, colour, *cov)
+
+    def fill_curve(s, tri, uv, inout, colour):
+        cov = coverage(tri[None], s.size)
+        if cov is not None:
+            blend(s.img, colour, *curve_side(tri, uv, inout, *cov))
+
+    def draw_batch(s, batch):
+        ''' Every group of the batch is blended in one go, see batch.Batch. Groups of the shader fill are
+        a single triangle each. '''
+        tris = s.to_pixels(batch.pos[:batch.count, :2].reshape(-1, 3, 2).astype(float))
+        for start, end in zip(batch.groups[:-1], batch.groups[1:]):
+            if end <= start:
+                continue
+            if start < batch.nfill:
+                s.fill_curve(tris[start//3], batch.uv[start:end].astype(float), batch.inout, batch.col[start])
+            else:
+                s.fill_triangles(tris[start//3:end//3], batch.col[start])
+
+    def draw_line(s, a, b, width, colour):
+        a, b = s.to_pixels(np.array([a], float)), s.to_pixels(np.array([b], float))
+        s.fill_triangles(thick_lines(a, b, width*s.zoom).reshape(-1, 3, 2), colour)
+
+    def draw_circle_gradient(s, pos, radius, inner, outer):
+        pos = s.to_pixels(np.array(pos, float))
+        x, y = np.meshgrid(np.arange(s.size[0]) + 0.5, np.arange(s.size[1]) + 0.5)
+        d = np.hypot(x - pos[0], y - pos[1])/(radius*s.zoom)
+        mask = d <= 1
+        t = d[mask][:, None]
+        s.img[mask] = np.rint(np.array(inner)*(1 - t) + np.array(outer)*t).astype(np.uint8)
+
+    def read(s):
+        ''' The current frame as RGBA bytes, top row first '''
+        return s.img.data
+
+    def reader(s, slots=6):
+        return CopyReader(s.img, slots)
+
+    def unload(s):
+        pass
+
+
+class CopyReader:
+    ''' Copies every frame into one of a ring of buffers, which is handed out until it's released, see
+    writer.FrameWriter. Blocks when all of them are still in use. '''
+    def __init__(s, img, slots):
+        s.img = img
+        s.free = queue.Queue()
+        for _ in range(slots):
+            s.free.put(np.empty_like(img))
+
+    def push(s):
+        buf = s.free.get()
+        np.copyto(buf, s.img)
+        return [(buf.data, lambda: s.free.put(buf))]
+
+    def flush(s):
+        return []
+
+    def unload(s):
+        pass
@@ -0,0 +1,249 @@
+from collections import deque
+
+import numpy as np
+import pyray as pr
+
+
+class BezierShader:
+    '''
+    Fills quadratic beziers without tessellating them (Loop-Blinn). Each segment is drawn as the one
+    triangle of its control points, with texture coordinates (0,0), (0.5,0), (1,1) at start, mid and
+    end. Interpolated over the triangle, u^2 - v is 0 on the curve, positive towards the mid control
+    point and negative towards the line from start to end, so every pixel knows which side it's on.
+    Divided by its screen space gradient that's about the distance to the curve in pixels, which gives
+    an anti-aliased edge at any resolution, even when rendering to a texture without MSAA.
+    Vertices with u < 0 (lines) are drawn as they are. Plain GLSL 3.30, tests/test_shader.py compiles it
+    without a window (Mesa's llvmpipe will do).
+    '''
+    vs = '''#version 330
+in vec3 vertexPosition;
+in vec2 vertexTexCoord;
+in vec4 vertexColor;
+uniform mat4 mvp;
+out vec2 fragTexCoord;
+out vec4 fragColor;
+void main() {
+    fragTexCoord = vertexTexCoord;
+    fragColor = vertexColor;
+    gl_Position = mvp*vec4(vertexPosition, 1.0);
+}
+'''
+    fs = '''#version 330
+in vec2 fragTexCoord;
+in vec4 fragColor;
+uniform int fillSide; // inout is a keyword in GLSL
+out vec4 finalColor;
+void main() {
+    vec2 p = fragTexCoord;
+    float f = p.x*p.x - p.y;
+    // Derivatives before any branching, they're undefined in non-uniform control flow
+    vec2 grad = vec2(2.0*p.x*dFdx(p.x) - dFdx(p.y), 2.0*p.x*dFdy(p.x) - dFdy(p.y));
+    if (p.x < 0.0) {
+        finalColor = fragColor;
+        return;
+    }
+    float d = f/max(length(grad), 1e-6);
+    if (fillSide != 0) d = -d;
+    float a = clamp(0.5 + d, 0.0, 1.0);
+    if (a <= 0.0) discard;
+    finalColor = vec4(fragColor.rgb, fragColor.a*a);
+}
+'''
+
+    def __init__(s):
+        s.shader = pr.load_shader_from_memory(s.vs, s.fs)
+        s.side_loc = pr.get_shader_location(s.shader, 'fillSide')
+        s.side = pr.ffi.new('int *')
+
+    def set_inout(s, inout):
+        s.side[0] = int(inout)
+        pr.set_shader_value(s.shader, s.side_loc, s.side, pr.SHADER_UNIFORM_INT)
+
+
+class MeshRenderer:
+    '''
+    Draws a batch.Batch with a single draw call. The batch buffers are streamed straight into a dynamic
+    raylib mesh (no Python lists in between), which gets uploaded again only when the batch has grown.
+    Batches with a shader fill are drawn with BezierShader, which is loaded the first time it's needed.
+    '''
+    def __init__(s):
+        s.mesh = None
+        s.pos = None
+        s.material = None
+        s.curve_material = None
+
+    def upload(s, batch):
+        s.unload_mesh()
+        s.mesh = pr.ffi.new('Mesh *')
+        s.mesh.vertexCount = len(batch.pos)
+        s.mesh.triangleCount = len(batch.pos)//3
+        s.mesh.vertices = pr.ffi.cast('float *', pr.ffi.from_buffer(batch.pos))
+        s.mesh.colors = pr.ffi.cast('unsigned char *', pr.ffi.from_buffer(batch.col))
+        s.mesh.texcoords = pr.ffi.cast('float *', pr.ffi.from_buffer(batch.uv))
+        pr.upload_mesh(s.mesh, True)
+        s.pos = batch.pos # Keep the buffer alive as long as the mesh points to it
+        if s.material is None:
+            s.material = pr.load_material_default()
+
+    def unload(s):
+        s.unload_mesh()
+        if s.curve_material is not None:
+            pr.unload_shader(s.curve_shader.shader)
+            s.curve_material = None
+
+    def unload_mesh(s):
+        if s.mesh is not None:
+            # The vertex data belongs to numpy, don't let raylib free it
+            s.mesh.vertices = pr.ffi.NULL
+            s.mesh.colors = pr.ffi.NULL
+            s.mesh.texcoords = pr.ffi.NULL
+            pr.unload_mesh(s.mesh[0])
+            s.mesh = None
+
+    def draw(s, batch):
+        if not batch.count:
+            return
+        if batch.pos is not s.pos:
+            s.upload(batch)
+        pr.update_mesh_buffer(s.mesh[0], pr.RL_DEFAULT_SHADER_ATTRIB_LOCATION_POSITION,
+                              pr.ffi.cast('void *', pr.ffi.from_buffer(batch.pos)), batch.count*12, 0)
+        pr.update_mesh_buffer(s.mesh[0], pr.RL_DEFAULT_SHADER_ATTRIB_LOCATION_COLOR,
+                              pr.ffi.cast('void *', pr.ffi.from_buffer(batch.col)), batch.count*4, 0)
+        material = s.material
+        if batch.nfill:
+            pr.update_mesh_buffer(s.mesh[0], pr.RL_DEFAULT_SHADER_ATTRIB_LOCATION_TEXCOORD,
+                                  pr.ffi.cast('void *', pr.ffi.from_buffer(batch.uv)), batch.count*8, 0)
+            if s.curve_material is None:
+                s.curve_shader = BezierShader()
+                s.curve_material = pr.load_material_default()
+                s.curve_material.shader = s.curve_shader.shader
+            s.curve_shader.set_inout(batch.inout)
+            material = s.curve_material
+        s.mesh.vertexCount = batch.count
+        s.mesh.triangleCount = batch.count//3
+
+        pr.rl_draw_render_batch_active() # Flush whatever raylib has queued up, e.g. the fade rectangle
+        pr.rl_disable_backface_culling() # Fans can go either way round
+        pr.draw_mesh(s.mesh[0], material, pr.matrix_identity())
+        pr.rl_enable_backface_culling()
+
+
+class RaylibBackend:
+    ''' Draws into the window, or into texture (a render texture) if given one. origin is the point of
+    the scene in the top left corner, zoom the number of pixels per unit, see tiles.TiledBackend. '''
+    def __init__(s, size, texture=None, origin=(0, 0), zoom=1):
+        s.size = size
+        s.texture = texture
+        s.origin = origin
+        s.zoom = zoom
+        s.camera = pr.Camera2D((0, 0), origin, 0, zoom) if origin != (0, 0) or zoom != 1 else None
+        s.mesh = MeshRenderer()
+
+    def begin(s):
+        if s.texture is not None:
+            pr.begin_texture_mode(s.texture)
+        else:
+            pr.begin_drawing()
+        if s.camera is not None:
+            pr.begin_mode_2d(s.camera)
+
+    def end(s):
+        if s.camera is not None:
+            pr.end_mode_2d()
+        if s.texture is not None:
+            pr.end_texture_mode()
+        else:
+            pr.end_drawing()
+
+    def clear(s, colour):
+        pr.clear_background(colour)
+
+    def fill_rect(s, colour):
+        pr.draw_rectangle_v(s.origin, (s.size[0]/s.zoom, s.size[1]/s.zoom), colour)
+
+    def draw_batch(s, batch):
+        s.mesh.draw(batch)
+
+    def draw_line(s, a, b, width, colour):
+        pr.draw_line_ex(a, b, width, colour)
+
+    def draw_circle_gradient(s, pos, radius, inner, outer):
+        pr.draw_circle_gradient(int(pos[0]), int(pos[1]), radius, inner, outer)
+
+    def read(s):
+        ''' The current contents of the render texture as RGBA bytes, top row first like
+        raster.SoftwareBackend.read '''
+        img = pr.load_image_from_texture(s.texture.texture)
+        buf = pr.ffi.buffer(pr.ffi.cast('char *', img.data), img.width*img.height*4)
+        # Render textures are stored bottom row first, flip them while copying them out
+        rows = np.frombuffer(buf, np.uint8).reshape(img.height, -1)[::-1].copy()
+        pr.unload_image(img) # Don't forget!
+        return rows.data
+
+    def reader(s, lag=2):
+        return LaggedReader(s.texture, lag)
+
+    def unload(s):
+        s.mesh.unload()
+        if s.texture is not None:
+            pr.unload_render_texture(s.texture)
+
+
+class LaggedReader:
+    '''
+    Reads frames back from a render texture lag frames late, see writer.FrameWriter. Every frame is copied
+    to a ring of textures on the GPU first, and by the time we ask for its pixels the GPU has long
+    finished drawing it, so the readback doesn't have to wait for the frame that's being drawn now.
+    The copy is drawn upside down, so that reading back the bottom row first storage of the render
+    texture gives the top row first, like every other reader. The pixels are handed out as a buffer on
+    top of raylib's image memory, which is freed on release.
+    '''
+    def __init__(s, texture, lag=2):
+        s.texture = texture
+        s.lag = lag
+        s.w, s.h = texture.texture.width, texture.texture.height
+        s.ring = [pr.load_render_texture(s.w, s.h) for _ in range(lag + 1)]
+        s.pending = deque()
+        s.i = 0
+
+    def push(s):
+        tex = s.ring[s.i % len(s.ring)]
+        s.i += 1
+        pr.begin_texture_mode(tex)
+        pr.clear_background((0,0,0,0))
+        pr.begin_blend_mode(pr.BLEND_ALPHA_PREMULTIPLY) # On a transparent background that's a plain copy
+        pr.draw_texture_rec(s.texture.texture, (0, 0, s.w, s.h), (0, 0), pr.WHITE) # Not -h, see above
+        pr.end_blend_mode()
+        pr.end_texture_mode()
+        s.pending.append(tex)
+        if len(s.pending) > s.lag:
+            return [s.read(s.pending.popleft())]
+        return []
+
+    def flush(s):
+        frames = [s.read(tex) for tex in s.pending]
+        s.pending.clear()
+        return frames
+
+    def read(s, tex):
+        img = pr.load_image_from_texture(tex.texture)
+        buf = pr.ffi.buffer(pr.ffi.cast('char *', img.data), img.width*img.height*4)
+        return buf, lambda: pr.unload_image(img)
+
+    def unload(s):
+        for tex in s.ring:
+            pr.unload_render_texture(tex)
+
+
+def draw_timings(stats, notes=(), x=10, y=10):
+    ''' Overlay with the stats of a timing.FrameTimer, in ms, and some more lines of text below '''
+    cols = ('p50', 'p95', 'p99')
+    pr.draw_rectangle(x - 6, y - 6, 100 + 70*len(cols), 20*(len(stats) + len(notes) + 1) + 10, (0,0,0,180))
+    for j, col in enumerate(cols):
+        pr.draw_text(col, x + 100 + 70*j, y, 20, pr.LIGHTGRAY)
+    for i, (name, st) in enumerate(stats.items(), 1):
+        pr.draw_text(name, x, y + 20*i, 20, pr.LIGHTGRAY)
+        for j, col in enumerate(cols):
+            pr.draw_text(f'{st[col]:.2f}', x + 100 + 70*j, y + 20*i, 20, pr.WHITE)
+    for i, note in enumerate(notes, len(stats) + 1):
+        pr.draw_text(note, x, y + 20*i, 20, pr.LIGHTGRAY)
@@ -0,0 +1,77 @@
+''' Render saved session files (see bez.Recorder.stop_recording) in a queue, several at a time. '''
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+
+# Very rough: the interpreter, raylib and numpy, plus frame buffers in flight for reading, converting and
+# the writer queue, plus ffmpeg's own lookahead. Errs on the safe side.
+base_mb = 400
+frames_per_job = 40
+
+
+def job_memory(size, ss=1, tile=2048):
+    '''
+    Rough guess of the memory (MB) one render of frames of size takes, drawn ss times larger in tiles of
+    at most tile pixels (see bez.export_target): on top of the frames in flight, the picture at full size
+    stays around between frames, and a row of tiles gets read back at a time.
+    '''
+    w, h = size
+    full = w*ss*h*ss*4
+    band = min(max(tile//ss, 1)*ss, h*ss)*w*ss*4
+    return base_mb + (w*h*4*frames_per_job + full + band)/1e6
+
+
+def render(job):
+    ''' (path, seconds it took, None) or, if it failed, (path, seconds, the traceback), so one bad session
+    doesn't stop the rest of the queue '''
+    path, backend, preset = job
+    t = time.perf_counter()
+    try:
+        import bez
+        bez.export_backend = backend
+        bez.export_workers = 1 # Pool workers can't have their own pool
+        if preset is not None:
+            bez.rec.preset = preset
+        bez.render_session(path)
+    except Exception:
+        return path, time.perf_counter() - t, traceback.format_exc()
+    return path, time.perf_counter() - t, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('sessions', nargs='+', help='.session.json files')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='renders at once (default: number of CPUs)')
+    parser.add_argument('--memory', type=int, help='memory budget in MB, limits the number of renders at once')
+    parser.add_argument('--backend', default='software', choices=('software', 'raylib'),
+                        help='software needs no display (default), raylib opens a hidden window per render')
+    parser.add_argument('--preset', help='encoder preset, see bez.presets')
+    args = parser.parse_args()
+
+    jobs = min(args.jobs, len(args.sessions))
+    if args.memory is not None:
+        import bez # The sessions were all recorded at bez.size, and exported at bez.export_size
+        mb = job_memory(bez.export_size, bez.export_supersample, bez.export_tile)
+        jobs = max(1, min(jobs, int(args.memory//mb)))
+    print(f'{len(args.sessions)} sessions, {jobs} at a time')
+
+    queue = [(path, args.backend, args.preset) for path in args.sessions]
+    # A fresh process for every session, bez keeps its state in module globals
+    failed = []
+    with multiprocessing.get_context('spawn').Pool(jobs, maxtasksperchild=1) as pool:
+        for i, (path, elapsed, error) in enumerate(pool.imap_unordered(render, queue), 1):
+            if error is None:
+                print(f'[{i}/{len(queue)}] {path} done in {elapsed:.0f}s')
+            else:
+                print(f'[{i}/{len(queue)}] {path} failed after {elapsed:.0f}s:\n{error}', file=sys.stderr)
+                failed.append(path)
+    if failed:
+        print(f'{len(failed)} of {len(queue)} sessions failed: {" ".join(failed)}', file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+''' Recorded sessions on disk: everything needed to render a recording again later, see bez.Recorder. '''
+import json
+
+version = 1
+
+
+def params(g):
+    ''' The values of all parameters of a Globals, including the ones that are still class defaults '''
+    return {k: getattr(g, k) for k in dir(g) if not k.startswith('_')}
+
+
+def tuples(v):
+    ''' JSON turns tuples into lists, turn them back so e.g. Globals.speeds.index(speed) still works '''
+    if isinstance(v, list):
+        return tuple(tuples(i) for i in v)
+    return v
+
+
+def save(path, name, seed, globals_, audio, events, size, fps):
+    sess = {
+        'version': version,
+        'name': name,
+        'seed': seed,
+        'globals': globals_,
+        'audio': audio,
+        'size': size,
+        'fps': fps,
+        'events': [[t, key] for t, key in events],
+    }
+    with open(path, 'w') as f:
+        json.dump(sess, f, separators=(',', ':'))
+
+
+def load(path):
+    with open(path) as f:
+        sess = json.load(f)
+    if sess.get('version') != version:
+        raise ValueError(f'{path}: unsupported session version {sess.get("version")}')
+    sess['globals'] = {k: tuples(v) for k, v in sess['globals'].items()}
+    sess['events'] = [(t, key) for t, key in sess['events']]
+    return sess
@@ -0,0 +1,71 @@
+import functools
+
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def basis(num):
+    ''' (num, 3) weights of the start, mid and end control points for num evenly spaced samples along a
+    quadratic bezier. Same thing as lerping between the lerps of both control lines. '''
+    t = np.linspace(0, 1, num)[:, None]
+    w = np.hstack(((1 - t)**2, 2*t*(1 - t), t**2))
+    w.flags.writeable = False
+    return w
+
+
+class Tessellator:
+    '''
+    Evaluates all segments of a curve into one vertex buffer, which is kept around and reused between
+    frames. Each segment gets a block of consecutive vertices: its mid control point, its samples going
+    from start to end, and the mid control point again. That way both triangle fans of a segment, in
+    either inout mode, are just (reversed) slices of the buffer. Block i starts at offsets[i].
+
+    The number of samples per segment adapts to how far the polyline may be off from the real curve,
+    in pixels (tol). Segments outside the view are culled before they get here, see Curve.cull.
+    '''
+    def __init__(s, max_num=64):
+        s.max_num = max_num
+        s.buf = np.empty((0, 2))
+        s.verts = s.buf
+        s.nums = np.empty(0, int)
+        s.offsets = np.zeros(1, int)
+
+    def sample_counts(s, ctrl, tol):
+        '''
+        The second derivative of a quadratic bezier is constant, 2*(start - 2*mid + end), so with m equal
+        steps in t the chords stray at most |start - 2*mid + end| / (4*m^2) from the curve. Take the
+        smallest m within tol, rounded up to a power of two so there are only a handful of different
+        counts (and bases) per frame.
+        '''
+        n = len(ctrl)
+        if tol <= 0:
+            return np.full(n, s.max_num)
+        dev = np.hypot(*(ctrl[:, 0] - 2*ctrl[:, 1] + ctrl[:, 2]).T)
+        m = np.sqrt(dev/(4*tol))
+        steps = 2**np.ceil(np.log2(np.maximum(m, 1))).astype(int)
+        return np.minimum(steps + 1, s.max_num)
+
+    def run(s, ctrl, tol=0):
+        ''' ctrl: (n, 3, 2) array of (start, mid, end) per segment, tol: max error in pixels, 0 to always
+        use max_num samples '''
+        s.nums = s.sample_counts(ctrl, tol)
+        s.offsets = np.zeros(len(ctrl) + 1, int)
+        np.cumsum(s.nums + 2, out=s.offsets[1:])
+        total = s.offsets[-1]
+        if len(s.buf) < total:
+            s.buf = np.empty((2*total, 2)) # Leave some room so the next frames don't reallocate
+        s.verts = s.buf[:total]
+        s.verts[s.offsets[:-1]] = ctrl[:, 1]
+        s.verts[s.offsets[1:] - 1] = ctrl[:, 1]
+        for num in np.unique(s.nums):
+            sel = np.flatnonzero(s.nums == num)
+            rows = s.offsets[sel, None] + 1 + np.arange(num)
+            s.verts[rows] = np.matmul(basis(num), ctrl[sel])
+        return s.verts
+
+    def fans(s, i, inout):
+        ''' Views of the forward and reversed triangle fan of segment i '''
+        o, e = s.offsets[i], s.offsets[i + 1]
+        if inout == 0:
+            return s.verts[o:e - 1], s.verts[e - 1:o:-1]
+        return s.verts[o + 1:e - 1], s.verts[e - 2:o:-1]
@@ -0,0 +1,22 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def schedule(monkeypatch):
+    ''' A short recording with lines on, that moves a point and goes round the palette '''
+    import pyray as pr
+
+    import bez
+    import session
+    monkeypatch.setattr(bez, 'rseed', 0.25)
+    monkeypatch.setattr(bez.rec, 'globals', dict(session.params(bez.Globals), lines=1, speed=(2, 5)))
+    schedule = [[] for _ in range(24)]
+    schedule[8].append(pr.KEY_Y)
+    schedule[16].append(pr.KEY_Q)
+    bez.rec.restart()
+    return schedule
@@ -0,0 +1,34 @@
+''' Drawing exports with raster.SoftwareBackend to compare them frame by frame, see conftest.schedule '''
+import numpy as np
+
+import bez
+from raster import SoftwareBackend
+from writer import FrameWriter
+
+
+class Frames:
+    ''' Takes the place of ffmpeg's stdin and keeps every frame '''
+    def __init__(s):
+        s.frames = []
+
+    def write(s, buf):
+        s.frames.append(bytes(buf))
+
+    def close(s):
+        pass
+
+
+def render(out, schedule, first, start, end):
+    ''' Frames start until end, as (h, w, 4) arrays, see bez.render_frames '''
+    sink = Frames()
+    bez.rec.writer = FrameWriter(sink, out.reader())
+    bez.render_frames(out, schedule, first, start, end)
+    bez.rec.writer.close()
+    w, h = bez.export_size
+    return [np.frombuffer(f, np.uint8).reshape(h, w, 4) for f in sink.frames]
+
+
+def restart():
+    ''' Back to the start of the recording, with a blank picture to draw it on '''
+    bez.rec.restart()
+    return SoftwareBackend(bez.size)
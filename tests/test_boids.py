@@ -0,0 +1,32 @@
+''' boids.neighbours against checking every pair '''
+import numpy as np
+import pytest
+
+from boids import neighbours
+
+
+def brute_force(pos, r):
+    d = pos[None, :] - pos[:, None]
+    i, j = np.nonzero((d**2).sum(axis=2) < r*r)
+    keep = i != j
+    return set(zip(i[keep].tolist(), j[keep].tolist()))
+
+
+@pytest.mark.parametrize('n, r', [
+    (3, 10), # Tables of a few buckets, so the 3x3 cells around a point share some
+    (4, 10),
+    (5, 40),
+    (200, 15),
+    (1000, 30),
+])
+def test_neighbours(n, r):
+    rng = np.random.default_rng(n)
+    spread = 2*r*np.sqrt(n) # So there are some neighbours
+    pos = rng.uniform(-spread, spread/2, (n, 2)) # Negative cells hash too
+    pos[1] = pos[0] # Points on top of each other
+    pos[-1] = (-r, 2*r) # On the corner of a cell
+    i, j, d = neighbours(pos, r)
+    pairs = list(zip(i.tolist(), j.tolist()))
+    assert len(pairs) == len(set(pairs)) # Every pair once each way round
+    assert set(pairs) == brute_force(pos, r) and pairs
+    assert np.array_equal(d, pos[j] - pos[i])
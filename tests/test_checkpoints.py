@@ -0,0 +1,52 @@
+''' checkpoints.Writer and Reader, and seeking a recording with them the way preview.py does '''
+import numpy as np
+import pytest
+
+import bez
+import checkpoints
+
+
+def test_at(tmp_path):
+    path = tmp_path/'a.checkpoints'
+    with checkpoints.Writer(path) as f:
+        for step in (0, 10, 20):
+            f.add(step, {'step': step, 'data': np.arange(step)})
+    ckpts = checkpoints.Reader(path)
+    for step, at in [(0, 0), (9, 0), (10, 10), (15, 10), (20, 20), (1000, 20)]:
+        found, state = ckpts.at(step)
+        assert found == at and state['step'] == at
+        assert np.array_equal(state['data'], np.arange(at))
+    ckpts.close()
+
+
+def test_not_checkpoints(tmp_path):
+    path = tmp_path/'a.session.json'
+    path.write_text('{}')
+    with pytest.raises(ValueError):
+        checkpoints.Reader(path)
+
+
+def test_seek(schedule, tmp_path, monkeypatch):
+    ''' Restoring the snapshot before a step and running on to it ends up where running from the start does '''
+    monkeypatch.setattr(bez, 'checkpoint_every', 7)
+    path = tmp_path/'a.checkpoints'
+    bez.build_checkpoints(schedule, path)
+    ckpts = checkpoints.Reader(path)
+    assert ckpts.steps == list(range(0, len(schedule), 7))
+    for target in (3, 7, 17, len(schedule)):
+        bez.rec.restart()
+        for step in range(target):
+            bez.sim_step(schedule, step)
+        expected = bez.snapshot()
+
+        found, state = ckpts.at(target)
+        bez.restore(state)
+        for step in range(found, target):
+            bez.sim_step(schedule, step)
+        for key, value in bez.snapshot().items():
+            if key == 'curve':
+                for name, a in value.items():
+                    assert np.array_equal(a, expected['curve'][name]), name
+            else:
+                assert value == expected[key], key
+    ckpts.close()
@@ -0,0 +1,71 @@
+''' The live clock staying in time with the audio of a recording, see bez.live_step '''
+import pyray as pr
+import pytest
+
+import bez
+from clock import Clock
+
+
+class Wall:
+    ''' Stands in for pr.get_time, and for the raylib audio calls, which take no time but the stall '''
+    def __init__(s, stall):
+        s.now = 0.0
+        s.stall = stall
+        s.played = None
+
+    def get_time(s):
+        return s.now
+
+    def load_sound(s, path):
+        s.now += s.stall # Loading the features, the sound and the new scene
+        return object()
+
+    def play_sound(s, sound):
+        s.played = s.now
+
+
+@pytest.fixture
+def wall(schedule, monkeypatch):
+    wall = Wall(1.0)
+    monkeypatch.setattr(pr, 'get_time', wall.get_time)
+    monkeypatch.setattr(pr, 'is_audio_device_ready', lambda: True)
+    monkeypatch.setattr(pr, 'load_sound', wall.load_sound)
+    monkeypatch.setattr(pr, 'play_sound', wall.play_sound)
+    monkeypatch.setattr(pr, 'unload_sound', lambda sound: None)
+    monkeypatch.setattr(bez, 'load_features', lambda audio: None)
+    monkeypatch.setattr(bez, 'clock', Clock(bez.fps))
+    monkeypatch.setattr(bez.rec, 'recording', False)
+    monkeypatch.setattr(bez.rec, 'events', bez.rec.events.copy())
+    monkeypatch.setattr(bez.rec, 'sound', None)
+    return wall
+
+
+def test_resync():
+    clock = Clock(60)
+    clock.tick_to(1)
+    clock.tick_to(1.125)
+    assert clock.due() == 8
+    clock.steps += 8
+    clock.resync(5) # What happened in between doesn't count
+    assert clock.due() == 0 and clock.alpha() == 1
+    clock.tick_to(5.0625)
+    assert clock.due() == 4
+
+
+def test_stalled_start(wall):
+    ''' Keys pressed after a start that stalled are stamped with the time since the sound started, and
+    the music is at the step that's playing '''
+    frame = 1/bez.fps
+    presses = {5: pr.KEY_LEFT_BRACKET, 30: pr.KEY_Y, 50: pr.KEY_Q}
+    stamps = {}
+    for i in range(60):
+        bez.clock.tick_to(wall.now)
+        key = presses.get(i)
+        bez.live_step([] if key is None else [key])
+        if key in (pr.KEY_Y, pr.KEY_Q):
+            stamps[key] = wall.now - wall.played
+            assert abs(bez.music_step - stamps[key]*bez.fps) <= 1
+        wall.now += frame
+    events = dict((key, t) for t, key in bez.rec.events)
+    for key, t in stamps.items():
+        assert abs(events[key] - t) <= frame
@@ -0,0 +1,36 @@
+''' engine.Curve against the way the old Point/Midpoint classes worked it out, one by one '''
+import random
+
+import numpy as np
+
+from engine import Curve
+
+
+def make_curve(n=8, close=True, seed=1):
+    random.seed(seed)
+    curve = Curve()
+    for _ in range(n):
+        curve.add_point((random.randrange(1280), random.randrange(800)), (2, 5), (0, 0, 0))
+    if close:
+        curve.close((0, 0, 0))
+    return curve
+
+
+def position(curve, node):
+    ''' Like Midpoint.pos: the midpoint of its parents, all the way down to control points '''
+    rows = curve.mids[curve.mids[:, 0] == node]
+    if not len(rows):
+        return curve.nodes[node]
+    _, a, b = rows[0]
+    pa, pb = position(curve, a), position(curve, b)
+    return ((pa[0] + pb[0])/2, (pa[1] + pb[1])/2)
+
+
+def test_midpoints():
+    for close in (False, True):
+        curve = make_curve(close=close)
+        for _ in range(10):
+            curve.move()
+        curve.update()
+        for node in range(len(curve.nodes)):
+            assert np.array_equal(curve.nodes[node], position(curve, node))
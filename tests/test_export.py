@@ -0,0 +1,76 @@
+''' Exports drawn in chunks, the way the workers of bez.Recorder.render_parallel do, against serial ones '''
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+import bez
+from clock import Clock
+from exports import render, restart
+from raster import SoftwareBackend
+
+
+@pytest.mark.parametrize('rate', [30, 60, 120])
+def test_chunked(schedule, monkeypatch, rate):
+    ''' A chunk that starts from a snapshot and the picture at its first frame is the serial render, at
+    frame rates that don't match the simulation too '''
+    monkeypatch.setattr(bez, 'export_fps', rate)
+    n = bez.export_frames(schedule)
+    serial = render(restart(), schedule, 0, 0, n)
+
+    first = n//2
+    out = restart()
+    before = render(out, schedule, 0, 0, first)
+    state = bez.snapshot()
+    picture = out.img.copy()
+    for step in range(Clock(bez.fps).steps_at(Fraction(first, bez.export_fps)), len(schedule)):
+        bez.sim_step(schedule, step) # Run on, the snapshot has to hold everything
+    bez.restore(state)
+    out = SoftwareBackend(bez.size)
+    out.img[:] = picture
+    chunk = render(out, schedule, first, first, n)
+
+    assert len(serial) == n
+    for a, b in zip(serial, before + chunk):
+        assert np.array_equal(a, b)
+
+
+def test_chunk_settings(schedule, monkeypatch):
+    ''' render_chunk draws with the settings it's sent, a spawned worker only has the defaults '''
+    for name in bez.chunk_settings:
+        monkeypatch.setattr(bez, name, getattr(bez, name)) # So they're put back afterwards
+    monkeypatch.setattr(bez.rec, 'preset', bez.rec.preset)
+    monkeypatch.setattr(bez.rec, 'start_encoder', lambda out, fname, audio: None)
+    monkeypatch.setattr(bez.rec, 'stop_encoder', lambda: None)
+    seen = {}
+    monkeypatch.setattr(bez, 'render_frames', lambda out, *args: seen.update(out=out, fps=bez.export_fps, fill=bez.curve_fill))
+
+    settings = dict(bez.export_settings(), export_backend='software', export_fps=24, curve_fill='shader', preset='webm')
+    part = bez.render_chunk((0, 0, 1, schedule, bez.snapshot(), settings, 'part000'))
+    assert part == 'part000.webm'
+    assert isinstance(seen['out'], SoftwareBackend)
+    assert seen['fps'] == 24 and seen['fill'] == 'shader'
+
+
+def test_warmup(schedule, monkeypatch):
+    ''' A chunk drawn on a blank picture from export_warmup frames before its start, like the workers do,
+    only differs from the serial render in the faint remains of old trails '''
+    monkeypatch.setattr(bez, 'export_fps', 30)
+    monkeypatch.setattr(bez, 'export_warmup', 3*30)
+    schedule += [[] for _ in range(bez.fps*bez.export_warmup//bez.export_fps)]
+    n = bez.export_frames(schedule)
+    start = n - 4
+    serial = render(restart(), schedule, 0, start, n)
+
+    first = start - bez.export_warmup
+    restart()
+    for step in range(Clock(bez.fps).steps_at(Fraction(first, bez.export_fps))):
+        bez.sim_step(schedule, step)
+    chunk = render(SoftwareBackend(bez.size), schedule, first, start, n)
+
+    # Fading by a (see bez.draw_frame) rounds to no change once a pixel is less than 255/2a off the
+    # background, which can leave the two that far off it on opposite sides
+    stall = int(255/(2*bez.per_frame(10, bez.export_fps)))
+    assert len(chunk) == len(serial) == 4
+    for a, b in zip(serial, chunk):
+        assert np.abs(a.astype(int) - b).max() <= 2*stall
@@ -0,0 +1,33 @@
+''' features.analyse, which works through the spectra a chunk at a time, against all of them at once '''
+import numpy as np
+
+import features
+
+
+def reference(samples, rate, fps):
+    ''' Band energies and flux from the whole (steps, n_fft//2 + 1) spectrogram '''
+    mag = np.concatenate([m for _, m in features.spectra(samples, rate, fps)])
+    freqs = np.fft.rfftfreq(features.n_fft, 1/rate)
+    energy = [np.log1p((mag[:, (freqs >= lo) & (freqs < hi)]**2).sum(axis=1)) for lo, hi in features.bands.values()]
+    logmag = np.log1p(mag)
+    flux = np.zeros(len(mag))
+    flux[1:] = np.maximum(logmag[1:] - logmag[:-1], 0).sum(axis=1)
+    return energy, flux
+
+
+def test_chunks(monkeypatch):
+    rate, fps = 8000, 60
+    rng = np.random.default_rng(0)
+    t = np.arange(rate*10)/rate
+    beat = np.sin(2*np.pi*2*t) > 0.9 # 120 bpm
+    samples = (np.sin(2*np.pi*100*t)*beat + 0.05*rng.standard_normal(len(t))).astype(np.float32)
+    monkeypatch.setattr(features, 'chunk', 7) # Steps don't come in whole chunks
+    out = features.analyse(samples, rate, fps)
+    energy, flux = reference(samples, rate, fps)
+
+    assert len(out) == len(flux) == 10*fps
+    for name, e in zip(features.bands, energy):
+        assert np.allclose(out[name], features.normalize(e), atol=1e-4)
+    assert np.allclose(out['onset'], features.normalize(flux), atol=1e-4)
+    period = np.diff(np.nonzero(out['beat'])[0])
+    assert len(period) and (abs(period - fps/2) <= 1).all()
@@ -0,0 +1,64 @@
+''' framering.FrameRing and Reader in one process, with the reader falling behind. The readers read the
+writer's own FrameRing, attaching to it is for other processes. '''
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+import framering
+
+
+@pytest.fixture
+def ring():
+    ring = framering.FrameRing(f'bez_test_{os.getpid()}_{uuid.uuid4().hex[:8]}', (4, 2), slots=4, fps=30)
+    yield ring
+    if ring.head is not None:
+        ring.close()
+
+
+def write(ring, n):
+    ''' Frames numbered on, with every byte of frame n set to n '''
+    for _ in range(n):
+        ring.write(np.full(ring.frame_bytes, ring.seq + 1, np.uint8).data)
+
+
+def test_in_order(ring):
+    reader = framering.Reader(ring)
+    out = np.empty(ring.frame_bytes, np.uint8)
+    write(ring, 3)
+    for n in (1, 2, 3):
+        assert reader.next(out) == n and (out == n).all()
+    assert reader.dropped == 0
+    ring.head['closed'] = 1 # What the writer's close() tells readers
+    assert reader.next(out) is None
+
+
+def test_dropped(ring):
+    ''' A reader more than slots frames behind carries on from the oldest one still there '''
+    reader = framering.Reader(ring)
+    out = np.empty(ring.frame_bytes, np.uint8)
+    write(ring, 10)
+    assert reader.next(out) == 7 and (out == 7).all()
+    assert reader.dropped == 6
+    write(ring, 1)
+    assert [reader.next(out) for _ in range(4)] == [8, 9, 10, 11]
+    assert reader.dropped == 6
+
+
+def test_overwritten(ring):
+    ''' A slot the writer is writing again doesn't count as a frame '''
+    reader = framering.Reader(ring)
+    out = np.empty(ring.frame_bytes, np.uint8)
+    write(ring, 5)
+    ring.slot['seq'][2 % ring.slots] = 2*6 - 1 # Frame 6 is going in where frame 2 was
+    assert reader.next(out) == 3 and (out == 3).all()
+    assert reader.dropped == 2
+
+
+def test_not_a_ring(ring, monkeypatch):
+    # Attaching in the process that made it would take it off the resource tracker under the owner
+    monkeypatch.setattr(framering.resource_tracker, 'unregister', lambda name, rtype: None)
+    ring.head['magic'] = b'NOTARING'
+    with pytest.raises(ValueError):
+        framering.FrameRing(ring.name)
@@ -0,0 +1,32 @@
+''' Sessions saved and loaded again, and rendered from a queue by render_sessions.py '''
+import bez
+import render_sessions
+import session
+
+
+def test_round_trip(tmp_path):
+    ''' Everything comes back as it went in, tuples included (JSON only has lists) '''
+    g = bez.Globals()
+    g.speed = g.speeds[3]
+    params = session.params(g)
+    events = [(0.0, 91), (1/60, 89), (2.5, 'stop!')]
+    path = tmp_path/'a.session.json'
+    session.save(path, 'a', 0.25, params, 'sound/a.mp3', events, bez.size, bez.fps)
+
+    sess = session.load(path)
+    assert sess['name'] == 'a' and sess['seed'] == 0.25 and sess['audio'] == 'sound/a.mp3'
+    assert tuple(sess['size']) == bez.size and sess['fps'] == bez.fps
+    assert sess['events'] == events
+    assert sess['globals'] == dict(params, speeds=tuple(params['speeds']))
+    assert isinstance(sess['globals']['speed'], tuple)
+    assert sess['globals']['speeds'].index(sess['globals']['speed']) == 3 # What KEY_R and KEY_F do
+
+
+def test_failed_render(tmp_path, monkeypatch):
+    ''' A session that can't be rendered comes back with its error instead of stopping the queue '''
+    monkeypatch.setattr(bez, 'export_backend', bez.export_backend)
+    monkeypatch.setattr(bez, 'export_workers', bez.export_workers)
+    path = str(tmp_path/'missing.session.json')
+    done, elapsed, error = render_sessions.render((path, 'software', None))
+    assert done == path
+    assert 'FileNotFoundError' in error
@@ -0,0 +1,115 @@
+''' Compile render.BezierShader on a headless OpenGL 3.3 core context (EGL, e.g. Mesa's llvmpipe), since
+raylib quietly falls back to its default shader when ours doesn't compile, and check what it fills with
+the software version of it '''
+import ctypes
+import ctypes.util
+
+import numpy as np
+import pytest
+
+import bez
+from raster import SoftwareBackend
+from render import BezierShader
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+EGL_OPENGL_API = 0x30A2
+EGL_CONTEXT_MAJOR_VERSION = 0x3098
+EGL_CONTEXT_MINOR_VERSION = 0x30FB
+EGL_CONTEXT_OPENGL_PROFILE_MASK = 0x30FD
+EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT = 1
+EGL_NONE = 0x3038
+GL_VERTEX_SHADER = 0x8B31
+GL_FRAGMENT_SHADER = 0x8B30
+GL_COMPILE_STATUS = 0x8B81
+GL_LINK_STATUS = 0x8B82
+
+c_void_p, c_uint, c_int, c_char_p = ctypes.c_void_p, ctypes.c_uint, ctypes.c_int, ctypes.c_char_p
+
+
+@pytest.fixture(scope='module')
+def gl():
+    ''' Looks up GL functions by name on a current context without a window '''
+    path = ctypes.util.find_library('EGL')
+    if path is None:
+        pytest.skip('no EGL')
+    egl = ctypes.CDLL(path)
+    egl.eglGetProcAddress.restype = c_void_p
+    egl.eglGetProcAddress.argtypes = [c_char_p]
+
+    def proc(name, restype, *argtypes):
+        ptr = egl.eglGetProcAddress(name.encode())
+        if not ptr:
+            pytest.skip(f'no {name}')
+        return ctypes.CFUNCTYPE(restype, *argtypes)(ptr)
+
+    display = proc('eglGetPlatformDisplayEXT', c_void_p, c_uint, c_void_p, c_void_p)(EGL_PLATFORM_SURFACELESS_MESA, None, None)
+    egl.eglInitialize.argtypes = [c_void_p, c_void_p, c_void_p]
+    if not display or not egl.eglInitialize(display, None, None):
+        pytest.skip('no surfaceless EGL display')
+    egl.eglBindAPI(EGL_OPENGL_API)
+    egl.eglCreateContext.restype = c_void_p
+    egl.eglCreateContext.argtypes = [c_void_p]*4
+    attribs = (c_int*7)(EGL_CONTEXT_MAJOR_VERSION, 3, EGL_CONTEXT_MINOR_VERSION, 3,
+                        EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT, EGL_NONE)
+    context = egl.eglCreateContext(display, None, None, attribs)
+    egl.eglMakeCurrent.argtypes = [c_void_p]*4
+    if not context or not egl.eglMakeCurrent(display, None, None, context):
+        pytest.skip('no OpenGL 3.3 core context')
+    yield proc
+    egl.eglMakeCurrent(display, None, None, None)
+    egl.eglDestroyContext.argtypes = [c_void_p]*2
+    egl.eglDestroyContext(display, context)
+    egl.eglTerminate.argtypes = [c_void_p]
+    egl.eglTerminate(display)
+
+
+def info_log(gl, name, obj):
+    log = ctypes.create_string_buffer(4096)
+    gl(name, None, c_uint, c_int, c_void_p, c_char_p)(obj, len(log), None, log)
+    return log.value.decode()
+
+
+def compile_shader(gl, kind, source):
+    shader = gl('glCreateShader', c_uint, c_uint)(kind)
+    src = c_char_p(source.encode())
+    gl('glShaderSource', None, c_uint, c_int, ctypes.POINTER(c_char_p), c_void_p)(shader, 1, ctypes.byref(src), None)
+    gl('glCompileShader', None, c_uint)(shader)
+    ok = c_int()
+    gl('glGetShaderiv', None, c_uint, c_uint, ctypes.POINTER(c_int))(shader, GL_COMPILE_STATUS, ctypes.byref(ok))
+    assert ok.value, info_log(gl, 'glGetShaderInfoLog', shader)
+    return shader
+
+
+def test_bezier_shader(gl):
+    vs = compile_shader(gl, GL_VERTEX_SHADER, BezierShader.vs)
+    fs = compile_shader(gl, GL_FRAGMENT_SHADER, BezierShader.fs)
+    program = gl('glCreateProgram', c_uint)()
+    gl('glAttachShader', None, c_uint, c_uint)(program, vs)
+    gl('glAttachShader', None, c_uint, c_uint)(program, fs)
+    gl('glLinkProgram', None, c_uint)(program)
+    ok = c_int()
+    gl('glGetProgramiv', None, c_uint, c_uint, ctypes.POINTER(c_int))(program, GL_LINK_STATUS, ctypes.byref(ok))
+    assert ok.value, info_log(gl, 'glGetProgramInfoLog', program)
+    # What BezierShader looks up, -1 if it got optimised away or misspelt
+    location = gl('glGetUniformLocation', c_int, c_uint, c_char_p)(program, b'fillSide')
+    assert location >= 0
+
+
+@pytest.mark.parametrize('inout', [0, 1])
+def test_shader_fill(schedule, monkeypatch, inout):
+    ''' Cutting each control point triangle along the curve fills the same pixels as the fans, but for
+    a few along the edges '''
+    monkeypatch.setattr(bez.rec, 'globals', dict(bez.rec.globals, lines=0, inout=inout))
+    monkeypatch.setattr(bez, 'opacity', 255)
+    images = []
+    for fill in ('fans', 'shader'):
+        monkeypatch.setattr(bez, 'curve_fill', fill)
+        bez.rec.restart()
+        out = SoftwareBackend(bez.size)
+        out.clear((0, 0, 0, 255))
+        bez.curve.update(0)
+        bez.draw_curve(bez.curve, out)
+        images.append(out.img.copy())
+    fans, shader = images
+    assert (fans != 0).any(axis=2).sum() > 10000
+    assert (fans != shader).any(axis=2).sum() < 0.01*(fans != 0).any(axis=2).sum()
@@ -0,0 +1,50 @@
+''' tess.Tessellator against the polylines the old Bezier class computed '''
+import numpy as np
+
+from test_engine import make_curve, position
+
+
+def polyline(start, mid, end, num=64):
+    ''' Bezier.update_bezier_points '''
+    ax, ay = start
+    bx, by = mid
+    cx, cy = end
+    lin1x, lin1y = np.linspace(ax, bx, num), np.linspace(ay, by, num)
+    lin2x, lin2y = np.linspace(bx, cx, num), np.linspace(by, cy, num)
+    px = lin1x + (lin2x - lin1x)/(num - 1)*np.arange(num)
+    py = lin1y + (lin2y - lin1y)/(num - 1)*np.arange(num)
+    return np.stack((px, py), axis=1)
+
+
+def test_tessellation():
+    curve = make_curve()
+    for _ in range(10):
+        curve.move()
+    curve.update(tol=0)
+    assert np.array_equal(curve.visible, np.arange(len(curve.segs)))
+    for i, seg in enumerate(curve.segs):
+        start, mid, end = (position(curve, node) for node in seg)
+        ref = polyline(start, mid, end)
+        forward, backward = curve.tess.fans(i, 1)
+        assert np.allclose(forward, ref, rtol=0, atol=1e-9)
+        assert np.allclose(backward, ref[::-1], rtol=0, atol=1e-9)
+        forward, backward = curve.tess.fans(i, 0)
+        assert np.array_equal(forward[0], mid) and np.array_equal(backward[0], mid)
+        assert np.allclose(forward[1:], ref, rtol=0, atol=1e-9)
+
+
+def test_tolerance():
+    ''' The adaptive polyline stays within tol of the curve '''
+    curve = make_curve(16)
+    curve.update(tol=0.5)
+    for i, seg in enumerate(curve.segs):
+        ref = polyline(*(curve.nodes[node] for node in seg), num=1025)
+        samples = curve.tess.fans(i, 1)[0]
+        # Distance from each point of the curve to the chord it's under
+        t = np.linspace(0, 1, 1025)
+        k = np.minimum((t*(len(samples) - 1)).astype(int), len(samples) - 2)
+        a, b = samples[k], samples[k + 1]
+        d = b - a
+        u = np.clip(np.einsum('ij,ij->i', ref - a, d)/np.maximum(np.einsum('ij,ij->i', d, d), 1e-12), 0, 1)
+        err = np.hypot(*(a + u[:, None]*d - ref).T)
+        assert err.max() <= 0.5 + 1e-9
@@ -0,0 +1,33 @@
+''' Exports drawn in tiles (tiles.TiledBackend) against the whole frame at once '''
+import numpy as np
+import pytest
+
+import bez
+from exports import render, restart
+from raster import SoftwareBackend
+from tiles import TiledBackend
+
+
+@pytest.mark.parametrize('tile', [300, 1000])
+def test_tiled(schedule, tile):
+    ''' Tiles at ss = 1 are the same picture as the whole frame at once '''
+    n = bez.export_frames(schedule)
+    whole = render(restart(), schedule, 0, 0, n)
+    restart()
+    tiled = render(TiledBackend(bez.size, 1, tile, SoftwareBackend, 1), schedule, 0, 0, n)
+    assert len(whole) == len(tiled) == n
+    for a, b in zip(whole, tiled):
+        assert np.array_equal(a, b)
+
+
+def test_supersampled(schedule):
+    ''' At ss = 2 the tile size doesn't matter '''
+    n = 8
+    frames = []
+    for tile in (512, 2048):
+        restart()
+        out = TiledBackend(bez.size, 2, tile, SoftwareBackend, 2)
+        frames.append(render(out, schedule, 0, 0, n))
+    assert len(frames[0]) == len(frames[1]) == n
+    for a, b in zip(*frames):
+        assert np.array_equal(a, b)
@@ -0,0 +1,32 @@
+''' writer.Yuv420p against the BT.601 formulas worked out one pixel at a time '''
+import numpy as np
+
+from writer import Yuv420p
+
+
+def test_yuv420p():
+    w, h = 6, 4
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (h, w, 4), np.uint8)
+    img[0, :2] = [[0, 0, 0, 255], [255, 255, 255, 255]] # The ends of the range
+    img[1, :2] = [[255, 0, 0, 0], [0, 0, 255, 0]]
+    out = np.frombuffer(Yuv420p((w, h))(img.tobytes()), np.uint8)
+
+    y = np.zeros((h, w), int)
+    for j in range(h):
+        for i in range(w):
+            r, g, b = (int(c) for c in img[j, i, :3])
+            y[j, i] = ((66*r + 129*g + 25*b + 128) >> 8) + 16
+    u = np.zeros((h//2, w//2), int)
+    v = np.zeros((h//2, w//2), int)
+    for j in range(h//2):
+        for i in range(w//2):
+            quad = img[2*j:2*j + 2, 2*i:2*i + 2, :3].reshape(4, 3).astype(int)
+            r, g, b = (quad.sum(axis=0) + 2) >> 2
+            u[j, i] = ((-38*r - 74*g + 112*b + 128) >> 8) + 128
+            v[j, i] = ((112*r - 94*g - 18*b + 128) >> 8) + 128
+
+    assert np.array_equal(out[:w*h].reshape(h, w), y)
+    assert np.array_equal(out[w*h:w*h*5//4].reshape(h//2, w//2), u)
+    assert np.array_equal(out[w*h*5//4:].reshape(h//2, w//2), v)
+    assert y.min() == 16 and y.max() == 235
@@ -0,0 +1,109 @@
+''' Exports at any resolution, drawn in tiles, see bez.export_target. '''
+import queue
+
+import numpy as np
+
+
+def box_filter(src, ss, out):
+    ''' Average every ss by ss block of src (h*ss, w*ss, 4) into out (h, w, 4), rounded '''
+    if ss == 1:
+        np.copyto(out, src)
+        return
+    acc = np.zeros(out.shape, np.uint16) # Fits up to ss = 16
+    for dy in range(ss):
+        for dx in range(ss):
+            acc += src[dy::ss, dx::ss]
+    acc += ss*ss//2
+    acc //= ss*ss
+    out[:] = acc
+
+
+class TiledBackend:
+    '''
+    Draws a frame of size pixels, ss times that in each direction, on a grid of tiles of at most tile
+    by tile pixels. zoom is the number of those pixels per unit of the scene. Each tile is a backend of
+    its own (made by make_tile(size, origin, zoom), e.g. render.RaylibBackend with its own render
+    texture) that sees the scene from its own origin, and every tile keeps its texture for the next
+    frame because the trails fade out over many frames. Drawing calls are collected between begin()
+    and end() and then played back on every tile.
+
+    Reading back goes one row of tiles at a time: the row is averaged down into the output frame right
+    away, so apart from the tiles themselves there's only ever one row of them in memory at full size.
+    '''
+    def __init__(s, size, ss, tile, make_tile, zoom):
+        s.size = size
+        s.ss = ss
+        s.zoom = zoom
+        w, h = size[0]*ss, size[1]*ss
+        tile = max(tile//ss, 1)*ss # Tiles have to line up with output pixels
+        s.rows = [] # (y, height, [(x, width, backend), ...]) in pixels of the full size frame
+        for y in range(0, h, tile):
+            th = min(tile, h - y)
+            row = []
+            for x in range(0, w, tile):
+                tw = min(tile, w - x)
+                row.append((x, tw, make_tile((tw, th), (x/zoom, y/zoom), zoom)))
+            s.rows.append((y, th, row))
+        s.ops = []
+
+    def tiles(s):
+        return [t for _, _, row in s.rows for _, _, t in row]
+
+    def begin(s):
+        s.ops = []
+
+    def end(s):
+        for t in s.tiles():
+            t.begin()
+            for name, args in s.ops:
+                getattr(t, name)(*args)
+            t.end()
+
+    def clear(s, colour):
+        s.ops.append(('clear', (colour,)))
+
+    def fill_rect(s, colour):
+        s.ops.append(('fill_rect', (colour,)))
+
+    def draw_batch(s, batch):
+        s.ops.append(('draw_batch', (batch,))) # The batch stays as it is until the next frame
+
+    def draw_line(s, a, b, width, colour):
+        s.ops.append(('draw_line', (a, b, width, colour)))
+
+    def draw_circle_gradient(s, pos, radius, inner, outer):
+        s.ops.append(('draw_circle_gradient', (pos, radius, inner, outer)))
+
+    def reader(s, slots=2):
+        return TiledReader(s, slots)
+
+    def unload(s):
+        for t in s.tiles():
+            t.unload()
+
+
+class TiledReader:
+    ''' Puts the tiles of a TiledBackend back together into a ring of output frames, like raster.CopyReader '''
+    def __init__(s, tiled, slots):
+        s.tiled = tiled
+        w, h = tiled.size
+        s.band = np.empty((max(th for _, th, _ in tiled.rows), w*tiled.ss, 4), np.uint8)
+        s.free = queue.Queue()
+        for _ in range(slots):
+            s.free.put(np.empty((h, w, 4), np.uint8))
+
+    def push(s):
+        buf = s.free.get()
+        ss = s.tiled.ss
+        for y, th, row in s.tiled.rows:
+            band = s.band[:th]
+            for x, tw, t in row:
+                band[:, x:x + tw] = np.frombuffer(t.read(), np.uint8).reshape(th, tw, 4)
+            box_filter(band, ss, buf[y//ss:(y + th)//ss])
+        return [(buf.data, lambda: s.free.put(buf))]
+
+    def flush(s):
+        return []
+
+    def unload(s):
+        pass
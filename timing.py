@@ -0,0 +1,87 @@
+''' Per-phase frame timings, see bez.draw_frame. Drawn on screen by render.draw_timings. '''
+import csv
+import json
+import time
+
+import numpy as np
+
+
+class FrameTimer:
+    '''
+    Keeps the durations of the phases of the last n frames in ring buffers. A frame starts with tick(),
+    and every lap(name) records the time since the previous lap (or tick) as phase name. tick() also
+    records the whole previous frame as 'frame'. When disabled, tick and lap return right away.
+    '''
+    def __init__(s, n=600, enabled=False):
+        s.n = n
+        s.enabled = enabled
+        s.clear()
+
+    def clear(s):
+        s.rings = {}
+        s.frames = 0 # Frames recorded so far, the ring index is frames % n
+        s.t_frame = None
+        s.t = None
+
+    def tick(s):
+        if not s.enabled:
+            return
+        t = time.perf_counter()
+        if s.t_frame is not None:
+            s.record('frame', t - s.t_frame)
+            s.frames += 1
+            for ring in s.rings.values():
+                ring[s.frames % s.n] = np.nan # Phases that don't happen in this frame
+        s.t_frame = s.t = t
+
+    def lap(s, name):
+        if not s.enabled or s.t is None:
+            return
+        t = time.perf_counter()
+        s.record(name, t - s.t)
+        s.t = t
+
+    def record(s, name, dt):
+        ring = s.rings.get(name)
+        if ring is None:
+            ring = s.rings[name] = np.full(s.n, np.nan)
+        ring[s.frames % s.n] = dt
+
+    def enable(s, on=True):
+        if on != s.enabled:
+            s.t_frame = s.t = None # Don't count the time it was off as a frame
+        s.enabled = on
+
+    def history(s, name):
+        ''' Durations of phase name in seconds of the finished frames, oldest first, nan for frames in which
+        it didn't happen '''
+        i = s.frames % s.n
+        ring = s.rings[name]
+        return np.concatenate((ring[i + 1:], ring[:i])) if s.frames >= s.n else ring[:i]
+
+    def stats(s):
+        ''' {phase: {mean, p50, p95, p99, max}} in milliseconds over the frames in the buffers '''
+        out = {}
+        for name in s.rings:
+            ms = s.history(name)*1e3
+            ms = ms[~np.isnan(ms)]
+            if len(ms):
+                p50, p95, p99 = np.percentile(ms, (50, 95, 99))
+                out[name] = {'count': len(ms), 'mean': ms.mean(), 'p50': p50, 'p95': p95, 'p99': p99, 'max': ms.max()}
+        return out
+
+    def dump(s, path):
+        ''' Write the stats and every frame to path: .csv gets one row per frame in ms, anything else JSON '''
+        names = list(s.rings)
+        if path.endswith('.csv'):
+            rows = np.stack([s.history(name)*1e3 for name in names], axis=1) if names else []
+            with open(path, 'w', newline='') as f:
+                w = csv.writer(f)
+                w.writerow(names)
+                w.writerows([['' if np.isnan(v) else f'{v:.4f}' for v in row] for row in rows])
+        else:
+            with open(path, 'w') as f:
+                json.dump({
+                    'stats': s.stats(),
+                    'frames_ms': {name: [None if np.isnan(v) else v*1e3 for v in s.history(name)] for name in names},
+                }, f)
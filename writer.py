@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+import numpy as np
+
+
+class Yuv420p:
+    '''
+    Converts RGBA frames to planar YUV 4:2:0, which is what the encoder wants anyway and only takes 1.5
+    bytes per pixel through the pipe instead of 4. BT.601 limited range in fixed point like ffmpeg does
+    by default, chroma from the average of each 2x2 block. The output buffer is reused for every frame.
+    '''
+    pix_fmt = 'yuv420p'
+
+    def __init__(s, size):
+        w, h = size
+        assert w % 2 == 0 and h % 2 == 0, 'yuv420p needs an even width and height'
+        s.w, s.h = w, h
+        s.out = np.empty(w*h*3//2, np.uint8)
+        s.y = s.out[:w*h].reshape(h, w)
+        s.u = s.out[w*h:w*h*5//4].reshape(h//2, w//2)
+        s.v = s.out[w*h*5//4:].reshape(h//2, w//2)
+        # Everything fits in 16 bits if the offsets are added before subtracting
+        s.acc = np.empty((h, w), np.uint16)
+        s.tmp = np.empty((h, w), np.uint16)
+        s.rgb = np.empty((3, h//2, w//2), np.uint16)
+
+    def __call__(s, buf):
+        img = np.frombuffer(buf, np.uint8).reshape(s.h, s.w, 4)
+        acc, tmp = s.acc, s.tmp
+        np.multiply(img[..., 0], np.uint16(66), out=acc)
+        acc += np.multiply(img[..., 1], np.uint16(129), out=tmp)
+        acc += np.multiply(img[..., 2], np.uint16(25), out=tmp)
+        acc += 128 + (16 << 8)
+        np.right_shift(acc, 8, out=s.y, casting='unsafe')
+
+        quads = img.reshape(s.h//2, 2, s.w//2, 2, 4)
+        for i, c in enumerate(s.rgb):
+            np.add(quads[:, 0, :, 0, i], quads[:, 0, :, 1, i], out=c, dtype=np.uint16)
+            c += quads[:, 1, :, 0, i]
+            c += quads[:, 1, :, 1, i]
+            c += 2
+            c >>= 2
+        r, g, b = s.rgb
+        acc, tmp = s.acc[:s.h//2, :s.w//2], s.tmp[:s.h//2, :s.w//2]
+        np.multiply(b, np.uint16(112), out=acc)
+        acc += 128 + (128 << 8)
+        acc -= np.multiply(r, np.uint16(38), out=tmp)
+        acc -= np.multiply(g, np.uint16(74), out=tmp)
+        np.right_shift(acc, 8, out=s.u, casting='unsafe')
+        np.multiply(r, np.uint16(112), out=acc)
+        acc += 128 + (128 << 8)
+        acc -= np.multiply(g, np.uint16(94), out=tmp)
+        acc -= np.multiply(b, np.uint16(18), out=tmp)
+        np.right_shift(acc, 8, out=s.v, casting='unsafe')
+        return s.out.data
+
+
+class FrameWriter:
+    '''
+    Writes frames to f (ffmpeg's stdin) from a background thread, so drawing the next frame overlaps with
+    encoding the previous ones. Frames come from a reader (see RaylibBackend.reader and
+    SoftwareBackend.reader) as (buffer, release) pairs of RGBA pixels, top row first whichever backend
+    drew them. The buffer is written as is, without copying, or converted first (on the writer thread)
+    if there's a convert function like Yuv420p. Release is called once the writer is done with it. At most depth frames wait in the queue, after that write()
+    blocks until the encoder catches up.
+    '''
+    def __init__(s, f, reader, depth=4, convert=None):
+        s.f = f
+        s.reader = reader
+        s.convert = convert
+        s.queue = queue.Queue(depth)
+        s.error = None
+
+        s.frames = 0
+        s.nbytes = 0
+        s.depth_sum = 0
+        s.max_depth = 0
+        s.blocked = 0.0
+        s.t0 = time.perf_counter()
+
+        s.thread = threading.Thread(target=s.run, daemon=True)
+        s.thread.start()
+
+    def run(s):
+        while (frame := s.queue.get()) is not None:
+            buf, release = frame
+            try:
+                if s.convert is not None:
+                    buf = s.convert(buf)
+                    release()
+                    release = None
+                if s.error is None:
+                    s.f.write(buf)
+                    s.nbytes += memoryview(buf).nbytes
+            except OSError as e:
+                s.error = e # Keep draining the queue so put() doesn't block forever, put() raises it
+            finally:
+                if release is not None:
+                    release()
+
+    def put(s, frame):
+        if s.error is not None:
+            raise s.error
+        depth = s.queue.qsize()
+        s.depth_sum += depth
+        s.max_depth = max(s.max_depth, depth)
+        t = time.perf_counter()
+        s.queue.put(frame)
+        s.blocked += time.perf_counter() - t
+        s.frames += 1
+
+    def write(s):
+        ''' Hand the frame that was just drawn to the reader, and whatever it has read back to the thread '''
+        for frame in s.reader.push():
+            s.put(frame)
+
+    def close(s):
+        for frame in s.reader.flush():
+            s.put(frame)
+        s.queue.put(None)
+        s.thread.join()
+        s.reader.unload()
+        s.f.close()
+        s.report()
+        if s.error is not None:
+            raise s.error
+
+    def report(s):
+        elapsed = time.perf_counter() - s.t0
+        print(f'{s.frames} frames in {elapsed:.1f}s ({s.frames/elapsed:.1f} fps, {s.nbytes/elapsed/1e6:.0f} MB/s), '
+              f'queue depth avg {s.depth_sum/max(s.frames, 1):.1f} max {s.max_depth}, '
+              f'waited {s.blocked:.1f}s for the encoder')